@@ -20,17 +20,18 @@ class Config:
 
     @staticmethod
     def from_env() -> "Config":
-        bot_token = os.getenv("BOT_TOKEN", "").strip()
-        owner_id_raw = os.getenv("OWNER_ID", "").strip()
-        link_secret = os.getenv("LINK_SECRET", "").strip()
-        db_path = os.getenv("DB_PATH", "data/bot.db").strip()
-        db_backend = os.getenv("DB_BACKEND", "sqlite").strip().lower()
-        mongo_uri = os.getenv("MONGO_URI", "").strip()
-        mongo_db_name = os.getenv("MONGO_DB_NAME", "azfilestorepremium").strip()
-        xwallet_api_key = os.getenv("XWALLET_API_KEY", "").strip()
-        payment_gateway = os.getenv("PAYMENT_GATEWAY", "manual").strip().lower()
-        razorpay_key_id = os.getenv("RAZORPAY_KEY_ID", "").strip()
-        razorpay_key_secret = os.getenv("RAZORPAY_KEY_SECRET", "").strip()
+        env = os.environ
+        bot_token = env.get("BOT_TOKEN", "").strip()
+        owner_id_raw = env.get("OWNER_ID", "").strip()
+        link_secret = env.get("LINK_SECRET", "").strip()
+        db_path = env.get("DB_PATH", "data/bot.db").strip()
+        db_backend = env.get("DB_BACKEND", "sqlite").strip().lower()
+        mongo_uri = env.get("MONGO_URI", "").strip()
+        mongo_db_name = env.get("MONGO_DB_NAME", "azfilestorepremium").strip()
+        xwallet_api_key = env.get("XWALLET_API_KEY", "").strip()
+        payment_gateway = env.get("PAYMENT_GATEWAY", "manual").strip().lower()
+        razorpay_key_id = env.get("RAZORPAY_KEY_ID", "").strip()
+        razorpay_key_secret = env.get("RAZORPAY_KEY_SECRET", "").strip()
 
         if not bot_token:
             raise RuntimeError("BOT_TOKEN is required")
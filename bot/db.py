@@ -1,40 +1,144 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import sqlite3
 import time
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Callable, Optional, TypeVar
 
 import aiosqlite
 
+# Statements on the per-update hot path. sqlite3 keeps prepared statements in
+# a per-connection LRU keyed by SQL text (sized via cached_statements below).
+_SQL_UPSERT_USER = """
+INSERT INTO users(user_id, first_name, username, premium_until, created_at, last_seen)
+VALUES(?, ?, ?, 0, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+  first_name=excluded.first_name,
+  username=excluded.username,
+  last_seen=excluded.last_seen
+"""
+_SQL_GET_PREMIUM_UNTIL = "SELECT premium_until FROM users WHERE user_id=?"
+_SQL_CONSUME_PREMIUM_LINK = """
+UPDATE users
+SET premium_usage_day=?,
+    premium_usage_count=CASE WHEN premium_usage_day=? THEN premium_usage_count + 1 ELSE 1 END
+WHERE user_id=?
+  AND (premium_usage_day!=? OR premium_usage_count<premium_daily_limit)
+"""
+_SQL_GET_PREMIUM_USAGE = "SELECT premium_daily_limit, premium_usage_count FROM users WHERE user_id=?"
+_SQL_HAS_FORCE_JOIN_REQUEST = "SELECT 1 FROM force_join_requests WHERE channel_id=? AND user_id=?"
+_SQL_GET_FILE = "SELECT id, tg_file_id, file_unique_id, file_type, file_name, added_by, added_at FROM files WHERE id=?"
+_SQL_CREATE_LINK = """
+INSERT INTO links(code, target_type, target_id, access, created_by, created_at, last_used_at, uses)
+VALUES(?, ?, ?, ?, ?, ?, NULL, 0)
+ON CONFLICT(code) DO UPDATE SET
+  target_type=excluded.target_type,
+  target_id=excluded.target_id,
+  access=excluded.access,
+  created_by=excluded.created_by,
+  created_at=excluded.created_at,
+  last_used_at=NULL,
+  uses=0
+"""
+_SQL_GET_LINK = "SELECT code, target_type, target_id, access, created_by, created_at, last_used_at, uses FROM links WHERE code=?"
+_SQL_MARK_LINK_USED = "UPDATE links SET last_used_at=?, uses=uses+1 WHERE code=?"
+_SQL_CREATE_TOKEN = """
+INSERT INTO tokens(token, created_by, created_at, used_by, used_at, grant_seconds)
+VALUES(?, ?, ?, NULL, NULL, ?)
+ON CONFLICT(token) DO UPDATE SET
+  created_by=excluded.created_by,
+  created_at=excluded.created_at,
+  used_by=NULL,
+  used_at=NULL,
+  grant_seconds=excluded.grant_seconds
+"""
+_SQL_HAS_PURCHASED_LINK = "SELECT 1 FROM link_purchases WHERE user_id=? AND link_code=?"
+
+_T = TypeVar("_T")
+
 
 def _now() -> int:
     return int(time.time())
 
 
+def _payment_row(row: aiosqlite.Row) -> dict[str, Any]:
+    d = dict(row)
+    # Nullable columns that callers expect as 0 rather than None.
+    if d["projected_premium_until"] is None:
+        d["projected_premium_until"] = 0
+    if d["expires_at"] is None:
+        d["expires_at"] = 0
+    return d
+
+
 class Database:
     def __init__(self, path: str) -> None:
         self.path = path
         self._conn: aiosqlite.Connection | None = None
         self._settings_cache: dict[str, str | None] = {}
         self._force_channels_cache: list[dict[str, Any]] | None = None
-        self._admins_cache: set[int] | None = None
+        self._admins: set[int] = set()
+        self._settings_loaded = False
+        self._checkpoint_task: asyncio.Task[None] | None = None
 
     async def init(self) -> None:
         os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
-        self._conn = await aiosqlite.connect(self.path)
+        self._conn = await aiosqlite.connect(self.path, cached_statements=256)
+        self._conn.row_factory = aiosqlite.Row
         await self._conn.execute("PRAGMA journal_mode=WAL;")
         await self._conn.execute("PRAGMA synchronous=NORMAL;")
-        await self._conn.execute("PRAGMA cache_size=-64000;")
+        await self._conn.execute("PRAGMA cache_size=-65536;")
         await self._conn.execute("PRAGMA temp_store=MEMORY;")
+        await self._conn.execute("PRAGMA mmap_size=268435456;")
+        await self._conn.execute("PRAGMA journal_size_limit=67108864;")
+        await self._conn.execute("PRAGMA wal_autocheckpoint=1000;")
+        await self._conn.execute("PRAGMA busy_timeout=30000;")
         await self._conn.execute("PRAGMA foreign_keys=ON;")
         await self._ensure_schema()
+        await self._load_settings()
+        self._admins = set(await self._fetch_admin_ids())
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
 
     @property
     def conn(self) -> aiosqlite.Connection:
         assert self._conn is not None
         return self._conn
 
+    async def _fetchone(self, sql: str, params: tuple[Any, ...] = ()) -> Any:
+        # One worker-thread hop (execute + fetch + close) instead of three.
+        rows = await self.conn.execute_fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def _in_thread(self, fn: Callable[[sqlite3.Connection], _T]) -> _T:
+        # Bulk paths run start-to-finish in C on a short-lived sync connection
+        # instead of one aiosqlite queue hop per statement. WAL lets this
+        # connection work alongside the long-lived async one.
+        def _run() -> _T:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            try:
+                conn.execute("PRAGMA foreign_keys=ON")
+                return fn(conn)
+            finally:
+                conn.close()
+
+        return await asyncio.to_thread(_run)
+
+    async def _checkpoint_loop(self, interval: float = 60.0) -> None:
+        # Checkpoint on our own schedule so the WAL is folded back in the
+        # background instead of inside whichever user-facing commit happens to
+        # cross wal_autocheckpoint.
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.conn.execute_fetchall("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception:
+                pass
+
     async def close(self) -> None:
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            self._checkpoint_task = None
         if self._conn is not None:
             await self._conn.close()
             self._conn = None
@@ -53,6 +157,7 @@ class Database:
               created_at    INTEGER NOT NULL,
               last_seen     INTEGER NOT NULL
             );
+            CREATE INDEX IF NOT EXISTS idx_users_premium_until ON users(premium_until);
 
             CREATE TABLE IF NOT EXISTS admins (
               user_id  INTEGER PRIMARY KEY,
@@ -92,7 +197,6 @@ class Database:
               added_by       INTEGER NOT NULL,
               added_at       INTEGER NOT NULL
             );
-            CREATE INDEX IF NOT EXISTS idx_files_unique ON files(file_unique_id);
 
             CREATE TABLE IF NOT EXISTS messages (
               id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -149,6 +253,7 @@ class Database:
               used_at       INTEGER,
               grant_seconds INTEGER NOT NULL
             );
+            CREATE INDEX IF NOT EXISTS idx_tokens_used_by ON tokens(used_by);
 
             CREATE TABLE IF NOT EXISTS payment_requests (
               id            INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -169,6 +274,7 @@ class Database:
               processed_at  INTEGER
             );
             CREATE INDEX IF NOT EXISTS idx_payment_requests_user ON payment_requests(user_id, status);
+            CREATE INDEX IF NOT EXISTS idx_payment_requests_pending_exp ON payment_requests(status, expires_at);
 
             CREATE TABLE IF NOT EXISTS link_purchases (
                user_id      INTEGER NOT NULL,
@@ -187,16 +293,12 @@ class Database:
             """
         )
         # Lightweight migrations for existing databases.
-        cur = await self.conn.execute("PRAGMA table_info(force_channels)")
-        cols = await cur.fetchall()
-        await cur.close()
+        cols = await self.conn.execute_fetchall("PRAGMA table_info(force_channels)")
         col_names = {str(r[1]) for r in cols}
         if "mode" not in col_names:
             await self.conn.execute("ALTER TABLE force_channels ADD COLUMN mode TEXT NOT NULL DEFAULT 'direct'")
 
-        cur = await self.conn.execute("PRAGMA table_info(users)")
-        ucols = await cur.fetchall()
-        await cur.close()
+        ucols = await self.conn.execute_fetchall("PRAGMA table_info(users)")
         ucol_names = {str(r[1]) for r in ucols}
         if "premium_daily_limit" not in ucol_names:
             await self.conn.execute("ALTER TABLE users ADD COLUMN premium_daily_limit INTEGER NOT NULL DEFAULT 7")
@@ -205,9 +307,7 @@ class Database:
         if "premium_usage_count" not in ucol_names:
             await self.conn.execute("ALTER TABLE users ADD COLUMN premium_usage_count INTEGER NOT NULL DEFAULT 0")
 
-        cur = await self.conn.execute("PRAGMA table_info(payment_requests)")
-        pcols = await cur.fetchall()
-        await cur.close()
+        pcols = await self.conn.execute_fetchall("PRAGMA table_info(payment_requests)")
         pcol_names = {str(r[1]) for r in pcols}
         if "user_chat_id" not in pcol_names:
             await self.conn.execute("ALTER TABLE payment_requests ADD COLUMN user_chat_id INTEGER")
@@ -223,9 +323,7 @@ class Database:
             await self.conn.execute("ALTER TABLE payment_requests ADD COLUMN gateway_extra TEXT")
 
         # Migrate force_channels to support compound primary key (channel_id, bot_username)
-        cur = await self.conn.execute("PRAGMA table_info(force_channels)")
-        fcols = await cur.fetchall()
-        await cur.close()
+        fcols = await self.conn.execute_fetchall("PRAGMA table_info(force_channels)")
         fcol_names = {str(r[1]) for r in fcols}
         if "bot_username" not in fcol_names:
             await self.conn.execute("ALTER TABLE force_channels RENAME TO force_channels_old")
@@ -253,9 +351,7 @@ class Database:
             await self.conn.execute("DROP TABLE force_channels_old")
 
         # Migrate sub_bots to support log_channel_id, bot_username, and owner_id
-        cur = await self.conn.execute("PRAGMA table_info(sub_bots)")
-        scols = await cur.fetchall()
-        await cur.close()
+        scols = await self.conn.execute_fetchall("PRAGMA table_info(sub_bots)")
         scol_names = {str(r[1]) for r in scols}
         if "log_channel_id" not in scol_names:
             await self.conn.execute("ALTER TABLE sub_bots ADD COLUMN log_channel_id INTEGER")
@@ -264,72 +360,73 @@ class Database:
         if "owner_id" not in scol_names:
             await self.conn.execute("ALTER TABLE sub_bots ADD COLUMN owner_id INTEGER")
 
+        # Make files.file_unique_id unique so save_file can upsert. Older DBs may
+        # hold duplicates from the previous check-then-insert race: keep the
+        # oldest row as canonical and detach the rest (their ids stay valid for
+        # existing batch_items/links).
+        if not await self._fetchone("SELECT 1 FROM sqlite_master WHERE type='index' AND name='uq_files_unique'"):
+            await self.conn.execute(
+                """
+                UPDATE files SET file_unique_id=NULL
+                WHERE file_unique_id IS NOT NULL
+                  AND id NOT IN (SELECT MIN(id) FROM files WHERE file_unique_id IS NOT NULL GROUP BY file_unique_id)
+                """
+            )
+            await self.conn.execute("UPDATE files SET file_unique_id=NULL WHERE file_unique_id=''")
+            await self.conn.execute("DROP INDEX IF EXISTS idx_files_unique")
+            await self.conn.execute(
+                "CREATE UNIQUE INDEX uq_files_unique ON files(file_unique_id) WHERE file_unique_id IS NOT NULL"
+            )
+
         await self.conn.commit()
 
     # Users
     async def upsert_user(self, user_id: int, first_name: str | None, username: str | None) -> None:
         now = _now()
-        await self.conn.execute(
-            """
-            INSERT INTO users(user_id, first_name, username, premium_until, created_at, last_seen)
-            VALUES(?, ?, ?, 0, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-              first_name=excluded.first_name,
-              username=excluded.username,
-              last_seen=excluded.last_seen
-            """,
-            (int(user_id), first_name, username, now, now),
-        )
+        await self.conn.execute(_SQL_UPSERT_USER, (user_id, first_name, username, now, now))
         await self.conn.commit()
 
     async def is_premium_active(self, user_id: int) -> bool:
         now = _now()
-        cur = await self.conn.execute("SELECT premium_until FROM users WHERE user_id=?", (int(user_id),))
-        row = await cur.fetchone()
-        await cur.close()
-        return bool(row and int(row[0]) >= now)
+        row = await self._fetchone(_SQL_GET_PREMIUM_UNTIL, (user_id,))
+        return bool(row and row[0] >= now)
 
     async def get_premium_until(self, user_id: int) -> int:
-        cur = await self.conn.execute("SELECT premium_until FROM users WHERE user_id=?", (int(user_id),))
-        row = await cur.fetchone()
-        await cur.close()
-        return int(row[0]) if row and row[0] is not None else 0
+        row = await self._fetchone(_SQL_GET_PREMIUM_UNTIL, (user_id,))
+        return row[0] if row else 0
 
     async def get_user(self, user_id: int) -> Optional[dict[str, Any]]:
-        cur = await self.conn.execute(
+        row = await self._fetchone(
             "SELECT user_id, first_name, username, premium_until, created_at, last_seen FROM users WHERE user_id=?",
             (int(user_id),),
         )
-        row = await cur.fetchone()
-        await cur.close()
         if not row:
             return None
         return {
-            "user_id": int(row[0]),
-            "first_name": row[1] or "",
-            "username": row[2] or "",
-            "premium_until": int(row[3]) if row[3] is not None else 0,
-            "created_at": int(row[4]) if row[4] is not None else 0,
-            "last_seen": int(row[5]) if row[5] is not None else 0,
+            "user_id": row["user_id"],
+            "first_name": row["first_name"] or "",
+            "username": row["username"] or "",
+            "premium_until": row["premium_until"],
+            "created_at": row["created_at"],
+            "last_seen": row["last_seen"],
         }
 
     async def add_premium_seconds(self, user_id: int, seconds: int) -> int:
         now = _now()
-        cur = await self.conn.execute("SELECT premium_until FROM users WHERE user_id=?", (int(user_id),))
-        row = await cur.fetchone()
-        await cur.close()
-        current = int(row[0]) if row else 0
-        new_until = max(current, now) + int(seconds)
-        await self.conn.execute(
+        seconds = int(seconds)
+        row = await self._fetchone(
             """
             INSERT INTO users(user_id, premium_until, created_at, last_seen)
             VALUES(?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET premium_until=excluded.premium_until, last_seen=excluded.last_seen
+            ON CONFLICT(user_id) DO UPDATE SET
+              premium_until=MAX(users.premium_until, ?) + ?,
+              last_seen=excluded.last_seen
+            RETURNING premium_until
             """,
-            (int(user_id), int(new_until), now, now),
+            (int(user_id), now + seconds, now, now, now, seconds),
         )
         await self.conn.commit()
-        return int(new_until)
+        return row[0]
 
     async def set_premium_until(self, user_id: int, premium_until: int) -> None:
         now = _now()
@@ -360,40 +457,51 @@ class Database:
         # Daily quotas reset at midnight IST.
         day = (now + 19800) // (24 * 60 * 60)
         reset_at = ((day + 1) * 24 * 60 * 60) - 19800
-        cur = await self.conn.execute(
-            """
-            UPDATE users
-            SET premium_usage_day=?,
-                premium_usage_count=CASE WHEN premium_usage_day=? THEN premium_usage_count + 1 ELSE 1 END
-            WHERE user_id=?
-              AND (premium_usage_day!=? OR premium_usage_count<premium_daily_limit)
-            """,
-            (int(day), int(day), int(user_id), int(day)),
-        )
+        cur = await self.conn.execute(_SQL_CONSUME_PREMIUM_LINK, (day, day, user_id, day))
         allowed = bool(cur.rowcount and cur.rowcount > 0)
         await cur.close()
         await self.conn.commit()
-        cur = await self.conn.execute(
-            "SELECT premium_daily_limit, premium_usage_count FROM users WHERE user_id=?",
-            (int(user_id),),
-        )
-        row = await cur.fetchone()
-        await cur.close()
+        row = await self._fetchone(_SQL_GET_PREMIUM_USAGE, (user_id,))
         return {
             "allowed": allowed,
-            "limit": int(row[0]) if row and row[0] is not None else 7,
-            "used": int(row[1]) if row and row[1] is not None else 0,
+            "limit": row[0] if row else 7,
+            "used": row[1] if row else 0,
             "reset_at": reset_at,
         }
 
     async def list_user_ids(self) -> list[int]:
-        cur = await self.conn.execute("SELECT user_id FROM users")
-        rows = await cur.fetchall()
-        await cur.close()
-        return [int(r[0]) for r in rows]
+        def _list(conn: sqlite3.Connection) -> list[int]:
+            return [r[0] for r in conn.execute("SELECT user_id FROM users")]
+
+        return await self._in_thread(_list)
+
+    async def count_users(self) -> int:
+        row = await self._fetchone("SELECT COUNT(*) FROM users")
+        return row[0] if row else 0
+
+    async def iter_user_ids(self, chunk: int = 1000) -> AsyncIterator[list[int]]:
+        # Keyset pagination on the primary key: O(chunk) memory per page and the
+        # event loop gets control back between pages on large broadcasts.
+        last_id = None
+        while True:
+            if last_id is None:
+                rows = await self.conn.execute_fetchall(
+                    "SELECT user_id FROM users ORDER BY user_id LIMIT ?", (chunk,)
+                )
+            else:
+                rows = await self.conn.execute_fetchall(
+                    "SELECT user_id FROM users WHERE user_id>? ORDER BY user_id LIMIT ?", (last_id, chunk)
+                )
+            if not rows:
+                return
+            page = [r[0] for r in rows]
+            yield page
+            if len(page) < chunk:
+                return
+            last_id = page[-1]
 
     async def list_premium_records(self) -> list[dict[str, Any]]:
-        cur = await self.conn.execute(
+        rows = await self.conn.execute_fetchall(
             """
             SELECT user_id, first_name, username, premium_until, created_at, last_seen
             FROM users
@@ -401,24 +509,22 @@ class Database:
             ORDER BY premium_until DESC
             """
         )
-        rows = await cur.fetchall()
-        await cur.close()
         out: list[dict[str, Any]] = []
         for r in rows:
             out.append(
                 {
-                    "user_id": int(r[0]),
-                    "first_name": r[1] or "",
-                    "username": r[2] or "",
-                    "premium_until": int(r[3]) if r[3] is not None else 0,
-                    "created_at": int(r[4]) if r[4] is not None else 0,
-                    "last_seen": int(r[5]) if r[5] is not None else 0,
+                    "user_id": r["user_id"],
+                    "first_name": r["first_name"] or "",
+                    "username": r["username"] or "",
+                    "premium_until": r["premium_until"],
+                    "created_at": r["created_at"],
+                    "last_seen": r["last_seen"],
                 }
             )
         return out
 
     async def list_latest_payment_meta(self) -> dict[int, dict[str, Any]]:
-        cur = await self.conn.execute(
+        rows = await self.conn.execute_fetchall(
             """
             SELECT p.user_id, p.id, p.amount_rs, p.plan_days, p.status,
                    COALESCE(p.processed_at, p.created_at) AS payment_ts
@@ -426,55 +532,63 @@ class Database:
             INNER JOIN (
               SELECT user_id, MAX(id) AS max_id
               FROM payment_requests
+              WHERE status != 'expired'
               GROUP BY user_id
             ) x ON x.user_id = p.user_id AND x.max_id = p.id
             """
         )
-        rows = await cur.fetchall()
-        await cur.close()
         out: dict[int, dict[str, Any]] = {}
         for r in rows:
-            uid = int(r[0])
-            out[uid] = {
-                "request_id": int(r[1]) if r[1] is not None else 0,
-                "amount_rs": int(r[2]) if r[2] is not None else 0,
-                "plan_days": int(r[3]) if r[3] is not None else 0,
-                "status": str(r[4] or ""),
-                "payment_ts": int(r[5]) if r[5] is not None else 0,
+            out[r["user_id"]] = {
+                "request_id": r["id"],
+                "amount_rs": r["amount_rs"],
+                "plan_days": r["plan_days"],
+                "status": r["status"],
+                "payment_ts": r["payment_ts"],
             }
         return out
 
     # Admins
     async def is_admin(self, user_id: int) -> bool:
-        if self._admins_cache is None:
-            self._admins_cache = set(await self.list_admin_ids())
-        return int(user_id) in self._admins_cache
+        # Admins change rarely; the set is loaded at init and kept in step
+        # with add_admin/remove_admin, so auth checks never hit the DB.
+        return int(user_id) in self._admins
 
     async def add_admin(self, user_id: int, added_by: int) -> None:
-        if self._admins_cache is not None:
-            self._admins_cache.add(int(user_id))
         now = _now()
         await self.conn.execute(
-            "INSERT OR REPLACE INTO admins(user_id, added_by, added_at) VALUES(?, ?, ?)",
+            """
+            INSERT INTO admins(user_id, added_by, added_at) VALUES(?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET added_by=excluded.added_by, added_at=excluded.added_at
+            """,
             (int(user_id), int(added_by), now),
         )
         await self.conn.commit()
+        self._admins.add(int(user_id))
 
     async def remove_admin(self, user_id: int) -> None:
-        if self._admins_cache is not None:
-            self._admins_cache.discard(int(user_id))
         await self.conn.execute("DELETE FROM admins WHERE user_id=?", (int(user_id),))
         await self.conn.commit()
+        self._admins.discard(int(user_id))
+
+    async def _fetch_admin_ids(self) -> list[int]:
+        rows = await self.conn.execute_fetchall("SELECT user_id FROM admins")
+        return [r[0] for r in rows]
 
     async def list_admin_ids(self) -> list[int]:
-        cur = await self.conn.execute("SELECT user_id FROM admins")
-        rows = await cur.fetchall()
-        await cur.close()
-        return [int(r[0]) for r in rows]
+        # Served from the same mirror as is_admin(), so admin notifications
+        # don't query the DB either.
+        return list(self._admins)
 
     # Settings
+    async def _load_settings(self) -> None:
+        # The settings table is tiny; mirror it fully so lookups of unset keys
+        # don't fall through to SQLite either.
+        rows = await self.conn.execute_fetchall("SELECT key, value FROM settings")
+        self._settings_cache = {r[0]: r[1] for r in rows}
+        self._settings_loaded = True
+
     async def set_setting(self, key: str, value: str | None) -> None:
-        self._settings_cache[key] = value
         if value is None:
             await self.conn.execute("DELETE FROM settings WHERE key=?", (key,))
         else:
@@ -483,17 +597,49 @@ class Database:
                 (key, value),
             )
         await self.conn.commit()
+        self._settings_cache[key] = value
+
+    async def set_settings_many(self, items: dict[str, str]) -> None:
+        # Upserts every key with one executemany and a single commit.
+        if not items:
+            return
+        await self.conn.executemany(
+            "INSERT INTO settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            list(items.items()),
+        )
+        await self.conn.commit()
+        self._settings_cache.update(items)
 
     async def get_setting(self, key: str) -> Optional[str]:
         if key in self._settings_cache:
             return self._settings_cache[key]
-        cur = await self.conn.execute("SELECT value FROM settings WHERE key=?", (key,))
-        row = await cur.fetchone()
-        await cur.close()
+        if self._settings_loaded:
+            return None
+        row = await self._fetchone("SELECT value FROM settings WHERE key=?", (key,))
         val = row[0] if row else None
         self._settings_cache[key] = val
         return val
 
+    async def get_settings_many(self, keys: list[str]) -> dict[str, Optional[str]]:
+        out: dict[str, Optional[str]] = {}
+        missing: list[str] = []
+        for key in keys:
+            if key in self._settings_cache:
+                out[key] = self._settings_cache[key]
+            elif self._settings_loaded:
+                out[key] = None
+            else:
+                missing.append(key)
+        if missing:
+            placeholders = ",".join("?" for _ in missing)
+            rows = await self.conn.execute_fetchall(
+                f"SELECT key, value FROM settings WHERE key IN ({placeholders})", missing
+            )
+            found = {r[0]: r[1] for r in rows}
+            for key in missing:
+                out[key] = self._settings_cache[key] = found.get(key)
+        return out
+
     # Force channels
     async def add_force_channel(
         self,
@@ -548,15 +694,11 @@ class Database:
             self._force_channels_cache = {}
         if bot_username in self._force_channels_cache:
             return self._force_channels_cache[bot_username]
-        cur = await self.conn.execute(
+        rows = await self.conn.execute_fetchall(
             "SELECT channel_id, mode, invite_link, title, username FROM force_channels WHERE bot_username=? ORDER BY channel_id",
             (bot_username,),
         )
-        rows = await cur.fetchall()
-        await cur.close()
-        out: list[dict[str, Any]] = []
-        for r in rows:
-            out.append({"channel_id": int(r[0]), "mode": r[1], "invite_link": r[2], "title": r[3], "username": r[4]})
+        out = [dict(r) for r in rows]
         self._force_channels_cache[bot_username] = out
         return out
 
@@ -568,19 +710,25 @@ class Database:
             VALUES(?, ?, ?)
             ON CONFLICT(channel_id, user_id) DO UPDATE SET requested_at=excluded.requested_at
             """,
-            (int(channel_id), int(user_id), now),
+            (channel_id, user_id, now),
         )
         await self.conn.commit()
 
     async def has_force_join_request(self, channel_id: int, user_id: int) -> bool:
-        cur = await self.conn.execute(
-            "SELECT 1 FROM force_join_requests WHERE channel_id=? AND user_id=?",
-            (int(channel_id), int(user_id)),
-        )
-        row = await cur.fetchone()
-        await cur.close()
+        row = await self._fetchone(_SQL_HAS_FORCE_JOIN_REQUEST, (channel_id, user_id))
         return bool(row)
 
+    async def has_force_join_requests(self, user_id: int, channel_ids: list[int]) -> set[int]:
+        # Subset of channel_ids with a stored join request, in one query.
+        if not channel_ids:
+            return set()
+        marks = ",".join("?" * len(channel_ids))
+        rows = await self.conn.execute_fetchall(
+            f"SELECT channel_id FROM force_join_requests WHERE user_id=? AND channel_id IN ({marks})",
+            (int(user_id), *[int(c) for c in channel_ids]),
+        )
+        return {r[0] for r in rows}
+
     # Files
     async def save_file(
         self,
@@ -591,46 +739,29 @@ class Database:
         added_by: int,
     ) -> int:
         now = _now()
-        if file_unique_id:
-            cur = await self.conn.execute("SELECT id FROM files WHERE file_unique_id=?", (file_unique_id,))
-            row = await cur.fetchone()
-            await cur.close()
-            if row:
-                return int(row[0])
-        cur = await self.conn.execute(
-            "INSERT INTO files(tg_file_id, file_unique_id, file_type, file_name, added_by, added_at) VALUES(?, ?, ?, ?, ?, ?)",
-            (tg_file_id, file_unique_id, file_type, file_name, int(added_by), now),
+        # The no-op DO UPDATE makes RETURNING yield the existing id on a duplicate.
+        row = await self._fetchone(
+            """
+            INSERT INTO files(tg_file_id, file_unique_id, file_type, file_name, added_by, added_at)
+            VALUES(?, ?, ?, ?, ?, ?)
+            ON CONFLICT(file_unique_id) WHERE file_unique_id IS NOT NULL
+            DO UPDATE SET file_unique_id=excluded.file_unique_id
+            RETURNING id
+            """,
+            (tg_file_id, file_unique_id or None, file_type, file_name, int(added_by), now),
         )
         await self.conn.commit()
-        return int(cur.lastrowid)
+        return row[0]
 
     async def get_file(self, file_id: int) -> Optional[dict[str, Any]]:
-        cur = await self.conn.execute(
-            "SELECT id, tg_file_id, file_unique_id, file_type, file_name, added_by, added_at FROM files WHERE id=?",
-            (int(file_id),),
-        )
-        row = await cur.fetchone()
-        await cur.close()
+        row = await self._fetchone(_SQL_GET_FILE, (int(file_id),))
         if not row:
             return None
-        return {
-            "id": int(row[0]),
-            "tg_file_id": row[1],
-            "file_unique_id": row[2],
-            "file_type": row[3],
-            "file_name": row[4],
-            "added_by": int(row[5]),
-            "added_at": int(row[6]),
-        }
+        return dict(row)
 
     async def list_recent_files(self, limit: int = 15) -> list[dict[str, Any]]:
-        cur = await self.conn.execute("SELECT id, file_type, file_name, added_at FROM files ORDER BY id DESC LIMIT ?", (int(limit),))
-        rows = await cur.fetchall()
-        await cur.close()
-        out: list[dict[str, Any]] = []
-        for r in rows:
-            out.append({"id": int(r[0]), "file_type": r[1], "file_name": r[2], "added_at": int(r[3])})
-        return out
+        rows = await self.conn.execute_fetchall("SELECT id, file_type, file_name, added_at FROM files ORDER BY id DESC LIMIT ?", (int(limit),))
+        return [dict(r) for r in rows]
 
     # Messages (non-file content stored by reference for copy_message)
     async def save_message(self, from_chat_id: int, message_id: int, added_by: int) -> int:
@@ -643,40 +774,58 @@ class Database:
         return int(cur.lastrowid)
 
     async def get_message(self, msg_id: int) -> Optional[dict[str, Any]]:
-        cur = await self.conn.execute(
+        row = await self._fetchone(
             "SELECT id, from_chat_id, message_id, added_by, added_at FROM messages WHERE id=?",
             (int(msg_id),),
         )
-        row = await cur.fetchone()
-        await cur.close()
         if not row:
             return None
-        return {
-            "id": int(row[0]),
-            "from_chat_id": int(row[1]),
-            "message_id": int(row[2]),
-            "added_by": int(row[3]),
-            "added_at": int(row[4]),
-        }
+        return dict(row)
 
     # Batches
     async def create_batch(self, created_by: int, file_ids: list[int]) -> int:
         now = _now()
-        cur = await self.conn.execute("INSERT INTO batches(created_by, created_at) VALUES(?, ?)", (int(created_by), now))
-        batch_id = int(cur.lastrowid)
-        for ord_, fid in enumerate(file_ids):
-            await self.conn.execute(
-                "INSERT INTO batch_items(batch_id, file_id, ord) VALUES(?, ?, ?)",
-                (batch_id, int(fid), int(ord_)),
-            )
-        await self.conn.commit()
-        return batch_id
+        items = [int(fid) for fid in file_ids]
+
+        # One explicit transaction + executemany: a single commit/fsync for all
+        # items, executed entirely on the worker thread.
+        def _create(conn: sqlite3.Connection) -> int:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # FK checks for the items run once at COMMIT; SQLite resets this
+                # pragma when the transaction ends, so foreign_keys stays enforced.
+                conn.execute("PRAGMA defer_foreign_keys=ON")
+                cur = conn.execute("INSERT INTO batches(created_by, created_at) VALUES(?, ?)", (int(created_by), now))
+                batch_id = int(cur.lastrowid)
+                conn.executemany(
+                    "INSERT INTO batch_items(batch_id, file_id, ord) VALUES(?, ?, ?)",
+                    [(batch_id, fid, ord_) for ord_, fid in enumerate(items)],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return batch_id
+
+        return await self._in_thread(_create)
 
     async def get_batch_file_ids(self, batch_id: int) -> list[int]:
-        cur = await self.conn.execute("SELECT file_id FROM batch_items WHERE batch_id=? ORDER BY ord", (int(batch_id),))
-        rows = await cur.fetchall()
-        await cur.close()
-        return [int(r[0]) for r in rows]
+        rows = await self.conn.execute_fetchall("SELECT file_id FROM batch_items WHERE batch_id=? ORDER BY ord", (int(batch_id),))
+        return [r[0] for r in rows]
+
+    async def get_batch_files(self, batch_id: int) -> list[dict[str, Any]]:
+        # File rows in batch order with one JOIN instead of get_batch_file_ids() + N get_file().
+        rows = await self.conn.execute_fetchall(
+            """
+            SELECT f.id, f.tg_file_id, f.file_unique_id, f.file_type, f.file_name, f.added_by, f.added_at
+            FROM batch_items bi
+            JOIN files f ON f.id = bi.file_id
+            WHERE bi.batch_id=?
+            ORDER BY bi.ord
+            """,
+            (int(batch_id),),
+        )
+        return [dict(r) for r in rows]
 
     # Channel batches (range of posts by message_id)
     async def create_channel_batch(self, created_by: int, channel_id: int, start_msg_id: int, end_msg_id: int) -> int:
@@ -689,112 +838,99 @@ class Database:
         return int(cur.lastrowid)
 
     async def get_channel_batch(self, batch_id: int) -> Optional[dict[str, Any]]:
-        cur = await self.conn.execute(
+        row = await self._fetchone(
             "SELECT id, channel_id, start_msg_id, end_msg_id, created_by, created_at FROM channel_batches WHERE id=?",
             (int(batch_id),),
         )
-        row = await cur.fetchone()
-        await cur.close()
         if not row:
             return None
-        return {
-            "id": int(row[0]),
-            "channel_id": int(row[1]),
-            "start_msg_id": int(row[2]),
-            "end_msg_id": int(row[3]),
-            "created_by": int(row[4]),
-            "created_at": int(row[5]),
-        }
+        return dict(row)
 
     # Links
     async def create_link(self, code: str, target_type: str, target_id: int, access: str, created_by: int) -> None:
         now = _now()
         await self.conn.execute(
-            """
-            INSERT OR REPLACE INTO links(code, target_type, target_id, access, created_by, created_at, last_used_at, uses)
-            VALUES(?, ?, ?, ?, ?, ?, NULL, 0)
-            """,
+            _SQL_CREATE_LINK,
             (code, target_type, int(target_id), access, int(created_by), now),
         )
         await self.conn.commit()
 
-    async def get_link(self, code: str) -> Optional[dict[str, Any]]:
-        cur = await self.conn.execute(
-            "SELECT code, target_type, target_id, access, created_by, created_at, last_used_at, uses FROM links WHERE code=?",
-            (code,),
+    async def create_links_bulk(self, rows: list[tuple[str, str, int, str, int]]) -> None:
+        # rows are create_link()'s (code, target_type, target_id, access, created_by);
+        # all of them go in with one executemany and a single commit.
+        if not rows:
+            return
+        now = _now()
+        await self.conn.executemany(
+            _SQL_CREATE_LINK,
+            [(code, target_type, int(target_id), access, int(created_by), now) for code, target_type, target_id, access, created_by in rows],
         )
-        row = await cur.fetchone()
-        await cur.close()
+        await self.conn.commit()
+
+    async def get_link(self, code: str) -> Optional[dict[str, Any]]:
+        row = await self._fetchone(_SQL_GET_LINK, (code,))
         if not row:
             return None
-        return {
-            "code": row[0],
-            "target_type": row[1],
-            "target_id": int(row[2]),
-            "access": row[3],
-            "created_by": int(row[4]),
-            "created_at": int(row[5]),
-            "last_used_at": row[6],
-            "uses": int(row[7]),
-        }
+        return dict(row)
 
     async def mark_link_used(self, code: str) -> None:
         now = _now()
-        await self.conn.execute("UPDATE links SET last_used_at=?, uses=uses+1 WHERE code=?", (now, code))
+        await self.conn.execute(_SQL_MARK_LINK_USED, (now, code))
         await self.conn.commit()
 
     # Tokens
     async def create_token(self, token: str, created_by: int, grant_seconds: int) -> None:
         now = _now()
-        await self.conn.execute(
-            "INSERT OR REPLACE INTO tokens(token, created_by, created_at, used_by, used_at, grant_seconds) "
-            "VALUES(?, ?, ?, NULL, NULL, ?)",
-            (token, int(created_by), now, int(grant_seconds)),
+        await self.conn.execute(_SQL_CREATE_TOKEN, (token, int(created_by), now, int(grant_seconds)))
+        await self.conn.commit()
+
+    async def create_tokens_bulk(self, tokens: list[str], created_by: int, grant_seconds: int) -> None:
+        # Same upsert as create_token() for every token; one executemany, one commit.
+        if not tokens:
+            return
+        now = _now()
+        await self.conn.executemany(
+            _SQL_CREATE_TOKEN,
+            [(token, int(created_by), now, int(grant_seconds)) for token in tokens],
         )
         await self.conn.commit()
 
     async def redeem_token(self, token: str, user_id: int) -> Optional[int]:
-        cur = await self.conn.execute("SELECT used_by, grant_seconds FROM tokens WHERE token=?", (token,))
-        row = await cur.fetchone()
-        await cur.close()
-        if not row or row[0] is not None:
-            return None
-
-        grant_seconds = int(row[1])
         now = _now()
-        await self.conn.execute(
-            "UPDATE tokens SET used_by=?, used_at=? WHERE token=? AND used_by IS NULL",
+        # Claim and read in one statement (SQLite >= 3.35): a row comes back only
+        # if this call flipped used_by from NULL, so there is no check/update race.
+        row = await self._fetchone(
+            "UPDATE tokens SET used_by=?, used_at=? WHERE token=? AND used_by IS NULL RETURNING grant_seconds",
             (int(user_id), now, token),
         )
-        # aiosqlite/pysqlite rowcount can be unreliable; use SQLite `changes()`.
-        cur3 = await self.conn.execute("SELECT changes()")
-        changes_row = await cur3.fetchone()
-        await cur3.close()
         await self.conn.commit()
-        if not changes_row or int(changes_row[0]) != 1:
+        if not row:
             return None
-        return grant_seconds
+        return row[0]
 
     # Stats
     async def stats(self) -> dict[str, int]:
         now = _now()
-        out: dict[str, int] = {}
-        queries = [
-            ("users", "SELECT COUNT(*) FROM users", ()),
-            ("admins", "SELECT COUNT(*) FROM admins", ()),
-            ("files", "SELECT COUNT(*) FROM files", ()),
-            ("batches", "SELECT COUNT(*) FROM batches", ()),
-            ("links", "SELECT COUNT(*) FROM links", ()),
-            ("premium_active", "SELECT COUNT(*) FROM users WHERE premium_until>=?", (now,)),
-            ("tokens_total", "SELECT COUNT(*) FROM tokens", ()),
-            ("tokens_used", "SELECT COUNT(*) FROM tokens WHERE used_by IS NOT NULL", ()),
-        ]
-        for key, q, params in queries:
-            cur = await self.conn.execute(q, params)
-            row = await cur.fetchone()
-            await cur.close()
-            out[key] = int(row[0]) if row else 0
-        return out
+        keys = ("users", "admins", "files", "batches", "links", "premium_active", "tokens_total", "tokens_used")
+
+        def _stats(conn: sqlite3.Connection) -> Any:
+            return conn.execute(
+                """
+                SELECT
+                  (SELECT COUNT(*) FROM users),
+                  (SELECT COUNT(*) FROM admins),
+                  (SELECT COUNT(*) FROM files),
+                  (SELECT COUNT(*) FROM batches),
+                  (SELECT COUNT(*) FROM links),
+                  (SELECT COUNT(*) FROM users WHERE premium_until>=?),
+                  (SELECT COUNT(*) FROM tokens),
+                  (SELECT COUNT(*) FROM tokens WHERE used_by IS NOT NULL)
+                """,
+                (now,),
+            ).fetchone()
+
+        row = await self._in_thread(_stats)
+        return {key: row[i] if row else 0 for i, key in enumerate(keys)}
 
     # Payments
     async def create_payment_request(self, user_id: int, plan_key: str, plan_days: int, amount_rs: int) -> int:
@@ -838,7 +974,7 @@ class Database:
         return bool(cur.rowcount and cur.rowcount > 0)
 
     async def get_payment_request(self, request_id: int) -> Optional[dict[str, Any]]:
-        cur = await self.conn.execute(
+        row = await self._fetchone(
             """
             SELECT id, user_id, plan_key, plan_days, amount_rs, projected_premium_until, status, utr_text, user_chat_id, details_msg_id, qr_msg_id, expires_at, created_at, updated_at, processed_by, processed_at, gateway_extra
             FROM payment_requests
@@ -846,32 +982,12 @@ class Database:
             """,
             (int(request_id),),
         )
-        row = await cur.fetchone()
-        await cur.close()
         if not row:
             return None
-        return {
-            "id": int(row[0]),
-            "user_id": int(row[1]),
-            "plan_key": row[2],
-            "plan_days": int(row[3]),
-            "amount_rs": int(row[4]),
-            "projected_premium_until": int(row[5]) if row[5] is not None else 0,
-            "status": row[6],
-            "utr_text": row[7],
-            "user_chat_id": int(row[8]) if row[8] is not None else None,
-            "details_msg_id": int(row[9]) if row[9] is not None else None,
-            "qr_msg_id": int(row[10]) if row[10] is not None else None,
-            "expires_at": int(row[11]) if row[11] is not None else 0,
-            "created_at": int(row[12]),
-            "updated_at": int(row[13]),
-            "processed_by": row[14],
-            "processed_at": row[15],
-            "gateway_extra": row[16] if len(row) > 16 else None,
-        }
+        return _payment_row(row)
 
     async def get_latest_open_payment_request(self, user_id: int) -> Optional[dict[str, Any]]:
-        cur = await self.conn.execute(
+        row = await self._fetchone(
             """
             SELECT id
             FROM payment_requests
@@ -881,11 +997,9 @@ class Database:
             """,
             (int(user_id),),
         )
-        row = await cur.fetchone()
-        await cur.close()
         if not row:
             return None
-        return await self.get_payment_request(int(row[0]))
+        return await self.get_payment_request(row[0])
 
     async def set_payment_ui_messages(self, request_id: int, user_chat_id: int, details_msg_id: int, qr_msg_id: int | None) -> None:
         now = _now()
@@ -980,7 +1094,7 @@ class Database:
         await self.conn.commit()
 
     async def list_processed_payment_requests(self, since_ts: int, until_ts: int) -> list[dict[str, Any]]:
-        cur = await self.conn.execute(
+        rows = await self.conn.execute_fetchall(
             """
             SELECT id, user_id, plan_key, plan_days, amount_rs, processed_at
             FROM payment_requests
@@ -992,24 +1106,22 @@ class Database:
             """,
             (int(since_ts), int(until_ts)),
         )
-        rows = await cur.fetchall()
-        await cur.close()
         out: list[dict[str, Any]] = []
         for r in rows:
             out.append(
                 {
-                    "id": int(r[0]),
-                    "user_id": int(r[1]),
-                    "plan_key": str(r[2] or ""),
-                    "plan_days": int(r[3]) if r[3] is not None else 0,
-                    "amount_rs": int(r[4]) if r[4] is not None else 0,
-                    "processed_at": int(r[5]) if r[5] is not None else 0,
+                    "id": r["id"],
+                    "user_id": r["user_id"],
+                    "plan_key": r["plan_key"],
+                    "plan_days": r["plan_days"],
+                    "amount_rs": r["amount_rs"],
+                    "processed_at": r["processed_at"],
                 }
             )
         return out
 
     async def list_processed_payment_requests_detailed(self, since_ts: int, until_ts: int) -> list[dict[str, Any]]:
-        cur = await self.conn.execute(
+        rows = await self.conn.execute_fetchall(
             """
             SELECT id, user_id, plan_key, plan_days, amount_rs, projected_premium_until, status, utr_text, user_chat_id, details_msg_id, qr_msg_id, expires_at, created_at, updated_at, processed_by, processed_at, gateway_extra
             FROM payment_requests
@@ -1021,66 +1133,31 @@ class Database:
             """,
             (int(since_ts), int(until_ts)),
         )
-        rows = await cur.fetchall()
-        await cur.close()
-        out: list[dict[str, Any]] = []
-        for r in rows:
-            out.append(
-                {
-                    "id": int(r[0]),
-                    "user_id": int(r[1]),
-                    "plan_key": str(r[2] or ""),
-                    "plan_days": int(r[3]) if r[3] is not None else 0,
-                    "amount_rs": int(r[4]) if r[4] is not None else 0,
-                    "projected_premium_until": int(r[5]) if r[5] is not None else 0,
-                    "status": str(r[6] or ""),
-                    "utr_text": r[7] if r[7] is not None else None,
-                    "user_chat_id": int(r[8]) if r[8] is not None else None,
-                    "details_msg_id": int(r[9]) if r[9] is not None else None,
-                    "qr_msg_id": int(r[10]) if r[10] is not None else None,
-                    "expires_at": int(r[11]) if r[11] is not None else 0,
-                    "created_at": int(r[12]) if r[12] is not None else 0,
-                    "updated_at": int(r[13]) if r[13] is not None else 0,
-                    "processed_by": int(r[14]) if r[14] is not None else 0,
-                    "processed_at": int(r[15]) if r[15] is not None else 0,
-                    "gateway_extra": r[16] if len(r) > 16 else None,
-                }
-            )
-        return out
+        return [_payment_row(row) for row in rows]
 
 
     async def list_pending_payment_requests(self) -> list[dict[str, Any]]:
-        cur = await self.conn.execute(
+        rows = await self.conn.execute_fetchall(
             """
             SELECT id, user_id, plan_key, plan_days, amount_rs, projected_premium_until, status, utr_text, user_chat_id, details_msg_id, qr_msg_id, expires_at, created_at, updated_at, processed_by, processed_at, gateway_extra
             FROM payment_requests
             WHERE status='pending'
             """
         )
-        rows = await cur.fetchall()
-        await cur.close()
-        out: list[dict[str, Any]] = []
-        for row in rows:
-            out.append({
-                "id": int(row[0]),
-                "user_id": int(row[1]),
-                "plan_key": row[2],
-                "plan_days": int(row[3]),
-                "amount_rs": int(row[4]),
-                "projected_premium_until": int(row[5]) if row[5] is not None else 0,
-                "status": row[6],
-                "utr_text": row[7],
-                "user_chat_id": int(row[8]) if row[8] is not None else None,
-                "details_msg_id": int(row[9]) if row[9] is not None else None,
-                "qr_msg_id": int(row[10]) if row[10] is not None else None,
-                "expires_at": int(row[11]) if row[11] is not None else 0,
-                "created_at": int(row[12]),
-                "updated_at": int(row[13]),
-                "processed_by": row[14],
-                "processed_at": row[15],
-                "gateway_extra": row[16] if len(row) > 16 else None,
-            })
-        return out
+        return [_payment_row(row) for row in rows]
+
+    async def list_expired_pending_payment_requests(self) -> list[dict[str, Any]]:
+        # Overdue manual orders only: gateway orders (gateway_extra set) are
+        # expired by their own pollers.
+        rows = await self.conn.execute_fetchall(
+            """
+            SELECT id, user_id, plan_key, plan_days, amount_rs, projected_premium_until, status, utr_text, user_chat_id, details_msg_id, qr_msg_id, expires_at, created_at, updated_at, processed_by, processed_at, gateway_extra
+            FROM payment_requests
+            WHERE status='pending' AND expires_at <= ? AND gateway_extra IS NULL AND (utr_text IS NULL OR TRIM(utr_text)='')
+            """,
+            (_now(),),
+        )
+        return [_payment_row(row) for row in rows]
 
     async def bulk_expire_expired_payment_requests(self) -> int:
         now = _now()
@@ -1096,12 +1173,7 @@ class Database:
         return int(cur.rowcount or 0)
 
     async def has_purchased_link(self, user_id: int, link_code: str) -> bool:
-        cur = await self.conn.execute(
-            "SELECT 1 FROM link_purchases WHERE user_id=? AND link_code=?",
-            (int(user_id), str(link_code)),
-        )
-        row = await cur.fetchone()
-        await cur.close()
+        row = await self._fetchone(_SQL_HAS_PURCHASED_LINK, (user_id, link_code))
         return bool(row)
 
     async def record_link_purchase(self, user_id: int, link_code: str) -> None:
@@ -1151,11 +1223,9 @@ class Database:
         await self.conn.commit()
 
     async def list_sub_bots(self) -> list[dict[str, Any]]:
-        cur = await self.conn.execute(
+        rows = await self.conn.execute_fetchall(
             "SELECT token, added_by, added_at, log_channel_id, bot_username, owner_id FROM sub_bots"
         )
-        rows = await cur.fetchall()
-        await cur.close()
         out = []
         for r in rows:
             out.append({
@@ -1,34 +1,119 @@
 from __future__ import annotations
 
+import asyncio
 import time
-from typing import Any, Optional
-
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from typing import Any, AsyncIterator, Optional
+
+from pymongo import AsyncMongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+
+
+# Counter ids are reserved in blocks so most inserts skip the counters round-trip.
+_ID_BLOCK = 100
+# How long a cached premium_until may be served before re-reading it.
+_PREMIUM_TTL = 30.0
+
+
+def _fields(*names: str) -> dict[str, int]:
+    return {"_id": 0, **{n: 1 for n in names}}
+
+
+# Projections are module constants: built once, not per call. Each lists only
+# what the caller reads, so Mongo ships only those fields.
+_EXISTS_FIELDS = {"_id": 1}
+_PREMIUM_UNTIL_FIELDS = _fields("premium_until")
+_PREMIUM_USAGE_FIELDS = _fields("premium_daily_limit", "premium_usage_count")
+_GRANT_SECONDS_FIELDS = _fields("grant_seconds")
+_USER_ID_FIELDS = _fields("user_id")
+_CHANNEL_ID_FIELDS = _fields("channel_id")
+_SETTING_VALUE_FIELDS = _fields("value")
+_SETTING_FIELDS = _fields("key", "value")
+_ID_FIELDS = _fields("id")
+_RECENT_FILE_FIELDS = _fields("id", "file_type", "file_name", "added_at")
+_BATCH_FILE_IDS_FIELDS = _fields("file_ids")
+_FORCE_CHANNEL_FIELDS = _fields("channel_id", "mode", "invite_link", "title", "username")
+_PROCESSED_PAYMENT_FIELDS = _fields("id", "user_id", "plan_key", "plan_days", "amount_rs", "processed_at")
+_USER_FIELDS = _fields("user_id", "first_name", "username", "premium_until", "created_at", "last_seen")
+_FILE_FIELDS = _fields("id", "tg_file_id", "file_unique_id", "file_type", "file_name", "added_by", "added_at")
+_MESSAGE_FIELDS = _fields("id", "from_chat_id", "message_id", "added_by", "added_at")
+_CHANNEL_BATCH_FIELDS = _fields("id", "channel_id", "start_msg_id", "end_msg_id", "created_by", "created_at")
+_LINK_FIELDS = _fields("code", "target_type", "target_id", "access", "created_by", "created_at", "last_used_at", "uses")
+_PAYMENT_FIELDS = _fields(
+    "id",
+    "user_id",
+    "plan_key",
+    "plan_days",
+    "amount_rs",
+    "projected_premium_until",
+    "status",
+    "utr_text",
+    "user_chat_id",
+    "details_msg_id",
+    "qr_msg_id",
+    "expires_at",
+    "created_at",
+    "updated_at",
+    "processed_by",
+    "processed_at",
+    "gateway_extra",
+)
 
 
 def _now() -> int:
     return int(time.time())
 
 
+# Writes always store typed values, so the decoded documents are returned as
+# they are; only fields missing from documents written by older versions get
+# filled in.
+def _file_doc(row: dict[str, Any]) -> dict[str, Any]:
+    row.setdefault("file_unique_id", None)
+    row.setdefault("file_name", None)
+    return row
+
+
+def _payment_doc(row: dict[str, Any]) -> dict[str, Any]:
+    for key in ("utr_text", "user_chat_id", "details_msg_id", "qr_msg_id", "processed_by", "processed_at", "gateway_extra"):
+        row.setdefault(key, None)
+    # Callers expect 0 rather than None/missing here (as in the SQLite backend).
+    row["projected_premium_until"] = row.get("projected_premium_until") or 0
+    row["expires_at"] = row.get("expires_at") or 0
+    return row
+
+
 class MongoDatabase:
+    """
+    MongoDB backend with the same method surface as bot.db.Database.
+
+    Methods don't share per-call state, so independent reads can be issued
+    together with asyncio.gather to overlap their round-trips.
+    """
+
     def __init__(self, uri: str, db_name: str) -> None:
         self.uri = uri
         self.db_name = db_name
-        self._client: AsyncIOMotorClient | None = None
-        self._db: AsyncIOMotorDatabase | None = None
+        self._client: AsyncMongoClient | None = None
+        self._db: AsyncDatabase | None = None
         self._settings_cache: dict[str, str | None] = {}
         self._force_channels_cache: list[dict[str, Any]] | None = None
-        self._admins_cache: set[int] | None = None
+        self._admins: set[int] = set()
+        self._id_pools: dict[str, tuple[int, int]] = {}
+        self._id_locks: dict[str, asyncio.Lock] = {}
+        self._premium_cache: dict[int, tuple[int, float]] = {}
 
     @property
-    def db(self) -> AsyncIOMotorDatabase:
+    def db(self) -> AsyncDatabase:
         assert self._db is not None
         return self._db
 
     async def init(self) -> None:
         # Keep connection setup strict so slow/failed cluster links don't stall bot handlers.
-        self._client = AsyncIOMotorClient(
+        # The native async client binds to the running loop, so this must run
+        # from post_init (PTB's loop), not at import/config time. Every bot
+        # Application shares that one loop, so one client serves them all.
+        self._client = AsyncMongoClient(
             self.uri,
             serverSelectionTimeoutMS=5000,
             connectTimeoutMS=10000,
@@ -39,10 +124,11 @@ class MongoDatabase:
         self._db = self._client[self.db_name]
         await self._client.admin.command("ping")
         await self._ensure_schema()
+        self._admins = set(await self._fetch_admin_ids())
 
     async def close(self) -> None:
         if self._client is not None:
-            self._client.close()
+            await self._client.close()
             self._client = None
             self._db = None
 
@@ -50,10 +136,14 @@ class MongoDatabase:
         # Logical unique keys
         await self.db.users.create_index("user_id", unique=True)
         await self.db.users.create_index("premium_until")
+        # Covers get_premium_until(): answered from the index with no FETCH.
+        # Kept separate from the unique user_id index, since a unique compound
+        # key would stop enforcing one document per user.
+        await self.db.users.create_index([("user_id", 1), ("premium_until", 1)], name="uid_premium")
         await self.db.admins.create_index("user_id", unique=True)
         await self.db.settings.create_index("key", unique=True)
         await self.db.files.create_index("id", unique=True)
-        await self.db.files.create_index("file_unique_id", sparse=True)
+        await self._ensure_files_unique_index()
         await self.db.messages.create_index("id", unique=True)
         await self.db.batches.create_index("id", unique=True)
         await self.db.channel_batches.create_index("id", unique=True)
@@ -68,17 +158,72 @@ class MongoDatabase:
         await self.db.force_join_requests.create_index([("channel_id", 1), ("user_id", 1)], unique=True)
         await self.db.payment_requests.create_index("id", unique=True)
         await self.db.payment_requests.create_index("expires_at")
-        await self.db.payment_requests.create_index([("user_id", 1), ("status", 1)])
+        # Equality-Sort-Range order: the latest open request per user and the
+        # processed-in-range reports are served from the index without an
+        # in-memory sort.
+        try:
+            await self.db.payment_requests.drop_index("user_id_1_status_1")
+        except Exception:
+            pass
+        await self.db.payment_requests.create_index([("user_id", 1), ("status", 1), ("id", -1)])
+        await self.db.payment_requests.create_index([("status", 1), ("processed_at", 1), ("id", 1)])
+        await self.db.payment_requests.create_index([("status", 1), ("expires_at", 1)])
         await self.db.sub_bots.create_index("token", unique=True)
 
-    async def _next_id(self, name: str) -> int:
-        doc = await self.db.counters.find_one_and_update(
-            {"_id": name},
-            {"$inc": {"seq": 1}},
-            upsert=True,
-            return_document=ReturnDocument.AFTER,
+    async def _ensure_files_unique_index(self) -> None:
+        # file_unique_id dedup is enforced by a partial unique index (string
+        # values only). Older deployments had a sparse non-unique index and may
+        # hold duplicates: keep the lowest id per value and unset the rest.
+        info = await self.db.files.index_information()
+        if info.get("file_unique_id_1", {}).get("unique"):
+            return
+        await self.db.files.update_many({"file_unique_id": ""}, {"$unset": {"file_unique_id": ""}})
+        dupes = await self.db.files.aggregate(
+            [
+                {"$match": {"file_unique_id": {"$type": "string"}}},
+                {"$group": {"_id": "$file_unique_id", "ids": {"$push": "$id"}, "n": {"$sum": 1}}},
+                {"$match": {"n": {"$gt": 1}}},
+            ]
+        )
+        async for d in dupes:
+            keep = min(d["ids"])
+            await self.db.files.update_many(
+                {"file_unique_id": d["_id"], "id": {"$ne": keep}},
+                {"$unset": {"file_unique_id": ""}},
+            )
+        if "file_unique_id_1" in info:
+            await self.db.files.drop_index("file_unique_id_1")
+        await self.db.files.create_index(
+            "file_unique_id",
+            unique=True,
+            partialFilterExpression={"file_unique_id": {"$type": "string"}},
         )
-        return int(doc["seq"])
+
+    async def _next_id(self, name: str) -> int:
+        return (await self._next_ids(name, 1))[0]
+
+    async def _next_ids(self, name: str, count: int) -> list[int]:
+        # Hands out ids from an in-process (next, end) range and only touches
+        # the counters collection when it runs dry. Ids left in the range on
+        # restart are skipped, so sequences may have gaps.
+        lock = self._id_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            nxt, end = self._id_pools.get(name, (1, 0))
+            if end - nxt + 1 < count:
+                block = max(_ID_BLOCK, count)
+                doc = await self.db.counters.find_one_and_update(
+                    {"_id": name},
+                    {"$inc": {"seq": block}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                seq = int(doc["seq"])
+                if seq - block != end:
+                    # Another process took ids in between; drop the leftover.
+                    nxt = seq - block + 1
+                end = seq
+            self._id_pools[name] = (nxt + count, end)
+            return list(range(nxt, nxt + count))
 
     # Users
     async def upsert_user(self, user_id: int, first_name: str | None, username: str | None) -> None:
@@ -99,16 +244,22 @@ class MongoDatabase:
         )
 
     async def is_premium_active(self, user_id: int) -> bool:
-        now = _now()
-        row = await self.db.users.find_one({"user_id": int(user_id)}, {"premium_until": 1, "_id": 0})
-        return bool(row and int(row.get("premium_until") or 0) >= now)
+        return await self.get_premium_until(int(user_id)) >= _now()
 
     async def get_premium_until(self, user_id: int) -> int:
-        row = await self.db.users.find_one({"user_id": int(user_id)}, {"premium_until": 1, "_id": 0})
-        return int(row.get("premium_until") or 0) if row else 0
+        # premium_until (not the bool) is cached, so a hit stays correct even
+        # if the plan expires while cached; writes below refresh the entry.
+        uid = int(user_id)
+        hit = self._premium_cache.get(uid)
+        if hit is not None and hit[1] > time.monotonic():
+            return hit[0]
+        row = await self.db.users.find_one({"user_id": uid}, _PREMIUM_UNTIL_FIELDS, hint="uid_premium")
+        until = int(row.get("premium_until") or 0) if row else 0
+        self._premium_cache[uid] = (until, time.monotonic() + _PREMIUM_TTL)
+        return until
 
     async def get_user(self, user_id: int) -> Optional[dict[str, Any]]:
-        row = await self.db.users.find_one({"user_id": int(user_id)}, {"_id": 0})
+        row = await self.db.users.find_one({"user_id": int(user_id)}, _USER_FIELDS)
         if not row:
             return None
         return {
@@ -122,14 +273,26 @@ class MongoDatabase:
 
     async def add_premium_seconds(self, user_id: int, seconds: int) -> int:
         now = _now()
-        current = await self.get_premium_until(int(user_id))
-        new_until = max(current, now) + int(seconds)
-        await self.db.users.update_one(
+        # One atomic pipeline update: no read-modify-write window in which a
+        # concurrent grant could be lost.
+        doc = await self.db.users.find_one_and_update(
             {"user_id": int(user_id)},
-            {"$set": {"premium_until": int(new_until), "last_seen": now}, "$setOnInsert": {"created_at": now}},
+            [
+                {
+                    "$set": {
+                        "premium_until": {"$add": [{"$max": [{"$ifNull": ["$premium_until", 0]}, now]}, int(seconds)]},
+                        "last_seen": now,
+                        "created_at": {"$ifNull": ["$created_at", now]},
+                    }
+                }
+            ],
+            projection=_PREMIUM_UNTIL_FIELDS,
             upsert=True,
+            return_document=ReturnDocument.AFTER,
         )
-        return int(new_until)
+        new_until = int(doc["premium_until"])
+        self._premium_cache[int(user_id)] = (new_until, time.monotonic() + _PREMIUM_TTL)
+        return new_until
 
     async def set_premium_until(self, user_id: int, premium_until: int) -> None:
         now = _now()
@@ -138,6 +301,7 @@ class MongoDatabase:
             {"$set": {"premium_until": int(premium_until), "last_seen": now}, "$setOnInsert": {"created_at": now}},
             upsert=True,
         )
+        self._premium_cache[int(user_id)] = (int(premium_until), time.monotonic() + _PREMIUM_TTL)
 
     async def set_premium_daily_limit(self, user_id: int, daily_limit: int) -> None:
         now = _now()
@@ -204,7 +368,7 @@ class MongoDatabase:
                 "used": int(row.get("premium_usage_count") or 0),
                 "reset_at": reset_at,
             }
-        row = await self.db.users.find_one({"user_id": int(user_id)}, {"_id": 0, "premium_daily_limit": 1, "premium_usage_count": 1})
+        row = await self.db.users.find_one({"user_id": int(user_id)}, _PREMIUM_USAGE_FIELDS)
         return {
             "allowed": False,
             "limit": int((row or {}).get("premium_daily_limit") or 7),
@@ -213,42 +377,49 @@ class MongoDatabase:
         }
 
     async def list_user_ids(self) -> list[int]:
-        rows = self.db.users.find({}, {"user_id": 1, "_id": 0})
-        out: list[int] = []
-        async for r in rows:
-            out.append(int(r["user_id"]))
-        return out
+        # Large batches: the default first batch is only 101 docs, and each
+        # further batch is another getMore round-trip.
+        rows = await self.db.users.find({}, _USER_ID_FIELDS).batch_size(5000).to_list(None)
+        return [int(r["user_id"]) for r in rows]
+
+    async def count_users(self) -> int:
+        return int(await self.db.users.count_documents({}))
+
+    async def iter_user_ids(self, chunk: int = 1000) -> AsyncIterator[list[int]]:
+        # Keyset pagination over the unique user_id index keeps memory at O(chunk).
+        query: dict[str, Any] = {}
+        while True:
+            rows = (
+                self.db.users.find(query, _USER_ID_FIELDS)
+                .sort("user_id", 1)
+                .limit(int(chunk))
+                .batch_size(int(chunk))
+            )
+            page = [int(r["user_id"]) for r in await rows.to_list(None)]
+            if not page:
+                return
+            yield page
+            if len(page) < chunk:
+                return
+            query = {"user_id": {"$gt": page[-1]}}
 
     async def list_premium_records(self) -> list[dict[str, Any]]:
         rows = self.db.users.find(
             {"premium_until": {"$gt": 0}},
-            {
-                "_id": 0,
-                "user_id": 1,
-                "first_name": 1,
-                "username": 1,
-                "premium_until": 1,
-                "created_at": 1,
-                "last_seen": 1,
-            },
+            _USER_FIELDS,
             sort=[("premium_until", -1)],
+            batch_size=5000,
         )
-        out: list[dict[str, Any]] = []
-        async for r in rows:
-            out.append(
-                {
-                    "user_id": int(r.get("user_id") or 0),
-                    "first_name": r.get("first_name") or "",
-                    "username": r.get("username") or "",
-                    "premium_until": int(r.get("premium_until") or 0),
-                    "created_at": int(r.get("created_at") or 0),
-                    "last_seen": int(r.get("last_seen") or 0),
-                }
-            )
-        return out
+        # Writes always store ints, so the projected documents are returned
+        # as decoded. Users created by a premium grant may lack the name
+        # fields; the export reads every column with a default.
+        return await rows.to_list(None)
 
     async def list_latest_payment_meta(self) -> dict[int, dict[str, Any]]:
+        # Filter first so abandoned (expired) checkouts never reach the sort;
+        # the sort itself walks the unique id index backwards.
         pipeline = [
+            {"$match": {"status": {"$in": ["pending", "submitted", "processed", "rejected"]}}},
             {"$sort": {"id": -1}},
             {
                 "$group": {
@@ -257,51 +428,39 @@ class MongoDatabase:
                     "amount_rs": {"$first": "$amount_rs"},
                     "plan_days": {"$first": "$plan_days"},
                     "status": {"$first": "$status"},
-                    "processed_at": {"$first": "$processed_at"},
-                    "created_at": {"$first": "$created_at"},
+                    "payment_ts": {"$first": {"$ifNull": ["$processed_at", {"$ifNull": ["$created_at", 0]}]}},
                 }
             },
         ]
-        out: dict[int, dict[str, Any]] = {}
-        async for r in self.db.payment_requests.aggregate(pipeline):
-            uid = int(r.get("_id") or 0)
-            payment_ts = int(r.get("processed_at") or r.get("created_at") or 0)
-            out[uid] = {
-                "request_id": int(r.get("request_id") or 0),
-                "amount_rs": int(r.get("amount_rs") or 0),
-                "plan_days": int(r.get("plan_days") or 0),
-                "status": str(r.get("status") or ""),
-                "payment_ts": payment_ts,
-            }
-        return out
+        # The pipeline already emits the final shape; only _id is lifted out.
+        return {r.pop("_id"): r async for r in await self.db.payment_requests.aggregate(pipeline)}
 
     # Admins
     async def is_admin(self, user_id: int) -> bool:
-        if self._admins_cache is None:
-            self._admins_cache = set(await self.list_admin_ids())
-        return int(user_id) in self._admins_cache
+        # In-memory mirror of the admins collection (see init/add/remove).
+        return int(user_id) in self._admins
 
     async def add_admin(self, user_id: int, added_by: int) -> None:
-        if self._admins_cache is not None:
-            self._admins_cache.add(int(user_id))
         now = _now()
         await self.db.admins.update_one(
             {"user_id": int(user_id)},
             {"$set": {"user_id": int(user_id), "added_by": int(added_by), "added_at": now}},
             upsert=True,
         )
+        self._admins.add(int(user_id))
 
     async def remove_admin(self, user_id: int) -> None:
-        if self._admins_cache is not None:
-            self._admins_cache.discard(int(user_id))
         await self.db.admins.delete_one({"user_id": int(user_id)})
+        self._admins.discard(int(user_id))
+
+    async def _fetch_admin_ids(self) -> list[int]:
+        rows = await self.db.admins.find({}, _USER_ID_FIELDS).batch_size(5000).to_list(None)
+        return [int(r["user_id"]) for r in rows]
 
     async def list_admin_ids(self) -> list[int]:
-        rows = self.db.admins.find({}, {"user_id": 1, "_id": 0})
-        out: list[int] = []
-        async for r in rows:
-            out.append(int(r["user_id"]))
-        return out
+        # Served from the same mirror as is_admin(), so admin notifications
+        # don't query the DB either.
+        return list(self._admins)
 
     # Settings
     async def set_setting(self, key: str, value: str | None) -> None:
@@ -311,14 +470,38 @@ class MongoDatabase:
             return
         await self.db.settings.update_one({"key": key}, {"$set": {"key": key, "value": value}}, upsert=True)
 
+    async def set_settings_many(self, items: dict[str, str]) -> None:
+        if not items:
+            return
+        self._settings_cache.update(items)
+        await self.db.settings.bulk_write(
+            [UpdateOne({"key": k}, {"$set": {"key": k, "value": v}}, upsert=True) for k, v in items.items()],
+            ordered=False,
+        )
+
     async def get_setting(self, key: str) -> Optional[str]:
         if key in self._settings_cache:
             return self._settings_cache[key]
-        row = await self.db.settings.find_one({"key": key}, {"value": 1, "_id": 0})
+        row = await self.db.settings.find_one({"key": key}, _SETTING_VALUE_FIELDS)
         val = row.get("value") if row else None
         self._settings_cache[key] = val
         return val
 
+    async def get_settings_many(self, keys: list[str]) -> dict[str, Optional[str]]:
+        out: dict[str, Optional[str]] = {}
+        missing: list[str] = []
+        for key in keys:
+            if key in self._settings_cache:
+                out[key] = self._settings_cache[key]
+            else:
+                missing.append(key)
+        if missing:
+            rows = await self.db.settings.find({"key": {"$in": missing}}, _SETTING_FIELDS).to_list(None)
+            found = {r["key"]: r.get("value") for r in rows}
+            for key in missing:
+                out[key] = self._settings_cache[key] = found.get(key)
+        return out
+
     # Force channels
     async def add_force_channel(
         self,
@@ -362,8 +545,8 @@ class MongoDatabase:
             self._force_channels_cache = {}
         self._force_channels_cache.pop(bot_username, None)
         # Fetch the channel IDs to clean requests
-        cursor = self.db.force_channels.find({"bot_username": bot_username}, {"channel_id": 1, "_id": 0})
-        ch_ids = [int(r["channel_id"]) async for r in cursor]
+        cursor = self.db.force_channels.find({"bot_username": bot_username}, _CHANNEL_ID_FIELDS)
+        ch_ids = [int(r["channel_id"]) for r in await cursor.to_list(None)]
         await self.db.force_channels.delete_many({"bot_username": bot_username})
         if ch_ids:
             await self.db.force_join_requests.delete_many({"channel_id": {"$in": ch_ids}})
@@ -373,18 +556,20 @@ class MongoDatabase:
             self._force_channels_cache = {}
         if bot_username in self._force_channels_cache:
             return self._force_channels_cache[bot_username]
-        rows = self.db.force_channels.find({"bot_username": bot_username}, {"_id": 0}).sort("channel_id", 1)
-        out: list[dict[str, Any]] = []
-        async for r in rows:
-            out.append(
-                {
-                    "channel_id": int(r["channel_id"]),
-                    "mode": r.get("mode") or "direct",
-                    "invite_link": r.get("invite_link"),
-                    "title": r.get("title"),
-                    "username": r.get("username"),
-                }
-            )
+        rows = self.db.force_channels.find(
+            {"bot_username": bot_username},
+            _FORCE_CHANNEL_FIELDS,
+        ).sort("channel_id", 1)
+        out = [
+            {
+                "channel_id": int(r["channel_id"]),
+                "mode": r.get("mode") or "direct",
+                "invite_link": r.get("invite_link"),
+                "title": r.get("title"),
+                "username": r.get("username"),
+            }
+            for r in await rows.to_list(None)
+        ]
         self._force_channels_cache[bot_username] = out
         return out
 
@@ -399,10 +584,19 @@ class MongoDatabase:
     async def has_force_join_request(self, channel_id: int, user_id: int) -> bool:
         row = await self.db.force_join_requests.find_one(
             {"channel_id": int(channel_id), "user_id": int(user_id)},
-            {"_id": 1},
+            _EXISTS_FIELDS,
         )
         return bool(row)
 
+    async def has_force_join_requests(self, user_id: int, channel_ids: list[int]) -> set[int]:
+        if not channel_ids:
+            return set()
+        rows = self.db.force_join_requests.find(
+            {"channel_id": {"$in": [int(c) for c in channel_ids]}, "user_id": int(user_id)},
+            _CHANNEL_ID_FIELDS,
+        )
+        return {int(r["channel_id"]) async for r in rows}
+
     # Files
     async def save_file(
         self,
@@ -413,16 +607,36 @@ class MongoDatabase:
         added_by: int,
     ) -> int:
         now = _now()
-        if file_unique_id:
-            row = await self.db.files.find_one({"file_unique_id": file_unique_id}, {"id": 1, "_id": 0})
-            if row:
-                return int(row["id"])
+        # Reserved up front; if the upsert matches an existing file the id is
+        # simply never used (counter ids may have gaps).
         new_id = await self._next_id("files")
+        if file_unique_id:
+            try:
+                doc = await self.db.files.find_one_and_update(
+                    {"file_unique_id": file_unique_id},
+                    {
+                        "$setOnInsert": {
+                            "id": int(new_id),
+                            "tg_file_id": tg_file_id,
+                            "file_type": file_type,
+                            "file_name": file_name,
+                            "added_by": int(added_by),
+                            "added_at": now,
+                        }
+                    },
+                    projection=_ID_FIELDS,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # A concurrent upsert inserted the same file first.
+                doc = await self.db.files.find_one({"file_unique_id": file_unique_id}, _ID_FIELDS)
+            return int(doc["id"])
         await self.db.files.insert_one(
             {
                 "id": int(new_id),
                 "tg_file_id": tg_file_id,
-                "file_unique_id": file_unique_id,
+                "file_unique_id": None,
                 "file_type": file_type,
                 "file_name": file_name,
                 "added_by": int(added_by),
@@ -432,32 +646,16 @@ class MongoDatabase:
         return int(new_id)
 
     async def get_file(self, file_id: int) -> Optional[dict[str, Any]]:
-        row = await self.db.files.find_one({"id": int(file_id)}, {"_id": 0})
+        row = await self.db.files.find_one({"id": int(file_id)}, _FILE_FIELDS)
         if not row:
             return None
-        return {
-            "id": int(row["id"]),
-            "tg_file_id": row["tg_file_id"],
-            "file_unique_id": row.get("file_unique_id"),
-            "file_type": row["file_type"],
-            "file_name": row.get("file_name"),
-            "added_by": int(row["added_by"]),
-            "added_at": int(row["added_at"]),
-        }
+        return _file_doc(row)
 
     async def list_recent_files(self, limit: int = 15) -> list[dict[str, Any]]:
-        rows = self.db.files.find({}, {"id": 1, "file_type": 1, "file_name": 1, "added_at": 1, "_id": 0}).sort("id", -1).limit(int(limit))
-        out: list[dict[str, Any]] = []
-        async for r in rows:
-            out.append(
-                {
-                    "id": int(r["id"]),
-                    "file_type": r["file_type"],
-                    "file_name": r.get("file_name"),
-                    "added_at": int(r["added_at"]),
-                }
-            )
-        return out
+        rows = await self.db.files.find({}, _RECENT_FILE_FIELDS).sort("id", -1).limit(int(limit)).to_list(None)
+        for r in rows:
+            r.setdefault("file_name", None)
+        return rows
 
     # Messages
     async def save_message(self, from_chat_id: int, message_id: int, added_by: int) -> int:
@@ -475,16 +673,10 @@ class MongoDatabase:
         return int(new_id)
 
     async def get_message(self, msg_id: int) -> Optional[dict[str, Any]]:
-        row = await self.db.messages.find_one({"id": int(msg_id)}, {"_id": 0})
+        row = await self.db.messages.find_one({"id": int(msg_id)}, _MESSAGE_FIELDS)
         if not row:
             return None
-        return {
-            "id": int(row["id"]),
-            "from_chat_id": int(row["from_chat_id"]),
-            "message_id": int(row["message_id"]),
-            "added_by": int(row["added_by"]),
-            "added_at": int(row["added_at"]),
-        }
+        return row
 
     # Batches
     async def create_batch(self, created_by: int, file_ids: list[int]) -> int:
@@ -501,11 +693,21 @@ class MongoDatabase:
         return int(new_id)
 
     async def get_batch_file_ids(self, batch_id: int) -> list[int]:
-        row = await self.db.batches.find_one({"id": int(batch_id)}, {"file_ids": 1, "_id": 0})
+        row = await self.db.batches.find_one({"id": int(batch_id)}, _BATCH_FILE_IDS_FIELDS)
         if not row:
             return []
         return [int(x) for x in (row.get("file_ids") or [])]
 
+    async def get_batch_files(self, batch_id: int) -> list[dict[str, Any]]:
+        # Two queries total instead of get_batch_file_ids() + N get_file().
+        file_ids = await self.get_batch_file_ids(batch_id)
+        if not file_ids:
+            return []
+        by_id: dict[int, dict[str, Any]] = {}
+        async for row in self.db.files.find({"id": {"$in": file_ids}}, _FILE_FIELDS):
+            by_id[row["id"]] = _file_doc(row)
+        return [by_id[fid] for fid in file_ids if fid in by_id]
+
     # Channel batches
     async def create_channel_batch(self, created_by: int, channel_id: int, start_msg_id: int, end_msg_id: int) -> int:
         now = _now()
@@ -523,17 +725,10 @@ class MongoDatabase:
         return int(new_id)
 
     async def get_channel_batch(self, batch_id: int) -> Optional[dict[str, Any]]:
-        row = await self.db.channel_batches.find_one({"id": int(batch_id)}, {"_id": 0})
+        row = await self.db.channel_batches.find_one({"id": int(batch_id)}, _CHANNEL_BATCH_FIELDS)
         if not row:
             return None
-        return {
-            "id": int(row["id"]),
-            "channel_id": int(row["channel_id"]),
-            "start_msg_id": int(row["start_msg_id"]),
-            "end_msg_id": int(row["end_msg_id"]),
-            "created_by": int(row["created_by"]),
-            "created_at": int(row["created_at"]),
-        }
+        return row
 
     # Links
     async def create_link(self, code: str, target_type: str, target_id: int, access: str, created_by: int) -> None:
@@ -555,8 +750,34 @@ class MongoDatabase:
             upsert=True,
         )
 
+    async def create_links_bulk(self, rows: list[tuple[str, str, int, str, int]]) -> None:
+        # rows are create_link()'s (code, target_type, target_id, access, created_by).
+        if not rows:
+            return
+        now = _now()
+        ops = [
+            UpdateOne(
+                {"code": code},
+                {
+                    "$set": {
+                        "code": code,
+                        "target_type": target_type,
+                        "target_id": int(target_id),
+                        "access": access,
+                        "created_by": int(created_by),
+                        "created_at": now,
+                        "last_used_at": None,
+                        "uses": 0,
+                    }
+                },
+                upsert=True,
+            )
+            for code, target_type, target_id, access, created_by in rows
+        ]
+        await self.db.links.bulk_write(ops, ordered=False)
+
     async def get_link(self, code: str) -> Optional[dict[str, Any]]:
-        row = await self.db.links.find_one({"code": code}, {"_id": 0})
+        row = await self.db.links.find_one({"code": code}, _LINK_FIELDS)
         if not row:
             return None
         return {
@@ -592,11 +813,35 @@ class MongoDatabase:
             upsert=True,
         )
 
+    async def create_tokens_bulk(self, tokens: list[str], created_by: int, grant_seconds: int) -> None:
+        if not tokens:
+            return
+        now = _now()
+        ops = [
+            UpdateOne(
+                {"token": token},
+                {
+                    "$set": {
+                        "token": token,
+                        "created_by": int(created_by),
+                        "created_at": now,
+                        "used_by": None,
+                        "used_at": None,
+                        "grant_seconds": int(grant_seconds),
+                    }
+                },
+                upsert=True,
+            )
+            for token in tokens
+        ]
+        await self.db.tokens.bulk_write(ops, ordered=False)
+
     async def redeem_token(self, token: str, user_id: int) -> Optional[int]:
         now = _now()
         row = await self.db.tokens.find_one_and_update(
             {"token": token, "used_by": None},
             {"$set": {"used_by": int(user_id), "used_at": now}},
+            projection=_GRANT_SECONDS_FIELDS,
             return_document=ReturnDocument.BEFORE,
         )
         if not row:
@@ -604,25 +849,35 @@ class MongoDatabase:
         return int(row.get("grant_seconds") or 0)
 
     # Stats
+    async def _facet_counts(self, coll: AsyncCollection, filters: dict[str, dict[str, Any]]) -> dict[str, int]:
+        # Several filtered counts over one collection in a single round-trip.
+        pipeline = [{"$facet": {name: [{"$match": f}, {"$count": "n"}] for name, f in filters.items()}}]
+        doc: dict[str, Any] = {}
+        async for doc in await coll.aggregate(pipeline):
+            break
+        return {name: int(doc[name][0]["n"]) if doc.get(name) else 0 for name in filters}
+
     async def stats(self) -> dict[str, int]:
         now = _now()
-        users = await self.db.users.count_documents({})
-        admins = await self.db.admins.count_documents({})
-        files = await self.db.files.count_documents({})
-        batches = await self.db.batches.count_documents({})
-        links = await self.db.links.count_documents({})
-        premium_active = await self.db.users.count_documents({"premium_until": {"$gte": now}})
-        tokens_total = await self.db.tokens.count_documents({})
-        tokens_used = await self.db.tokens.count_documents({"used_by": {"$ne": None}})
+        # Unfiltered totals come from collection metadata; the filtered pairs
+        # share one $facet each. Everything is in flight at once.
+        user_counts, token_counts, admins, files, batches, links = await asyncio.gather(
+            self._facet_counts(self.db.users, {"total": {}, "active": {"premium_until": {"$gte": now}}}),
+            self._facet_counts(self.db.tokens, {"total": {}, "used": {"used_by": {"$ne": None}}}),
+            self.db.admins.estimated_document_count(),
+            self.db.files.estimated_document_count(),
+            self.db.batches.estimated_document_count(),
+            self.db.links.estimated_document_count(),
+        )
         return {
-            "users": int(users),
+            "users": user_counts["total"],
             "admins": int(admins),
             "files": int(files),
             "batches": int(batches),
             "links": int(links),
-            "premium_active": int(premium_active),
-            "tokens_total": int(tokens_total),
-            "tokens_used": int(tokens_used),
+            "premium_active": user_counts["active"],
+            "tokens_total": token_counts["total"],
+            "tokens_used": token_counts["used"],
         }
 
     # Payments
@@ -656,64 +911,23 @@ class MongoDatabase:
         return int(new_id)
 
     async def set_payment_utr(self, request_id: int, utr_text: str) -> bool:
-        now = _now()
-        res = await self.db.payment_requests.update_one(
-            {"id": int(request_id), "status": {"$in": ["pending", "submitted"]}},
-            {"$set": {"utr_text": utr_text, "status": "submitted", "updated_at": now}},
-        )
-        return bool(res.modified_count > 0)
+        return await self._transition_payment(request_id, ("pending", "submitted"), "submitted", utr_text=utr_text)
 
     async def get_payment_request(self, request_id: int) -> Optional[dict[str, Any]]:
-        row = await self.db.payment_requests.find_one({"id": int(request_id)}, {"_id": 0})
+        row = await self.db.payment_requests.find_one({"id": int(request_id)}, _PAYMENT_FIELDS)
         if not row:
             return None
-        return {
-            "id": int(row["id"]),
-            "user_id": int(row["user_id"]),
-            "plan_key": row["plan_key"],
-            "plan_days": int(row["plan_days"]),
-            "amount_rs": int(row["amount_rs"]),
-            "projected_premium_until": int(row.get("projected_premium_until") or 0),
-            "status": row["status"],
-            "utr_text": row.get("utr_text"),
-            "user_chat_id": int(row["user_chat_id"]) if row.get("user_chat_id") is not None else None,
-            "details_msg_id": int(row["details_msg_id"]) if row.get("details_msg_id") is not None else None,
-            "qr_msg_id": int(row["qr_msg_id"]) if row.get("qr_msg_id") is not None else None,
-            "expires_at": int(row.get("expires_at") or 0),
-            "created_at": int(row["created_at"]),
-            "updated_at": int(row["updated_at"]),
-            "processed_by": row.get("processed_by"),
-            "processed_at": row.get("processed_at"),
-            "gateway_extra": row.get("gateway_extra"),
-        }
+        return _payment_doc(row)
 
     async def get_latest_open_payment_request(self, user_id: int) -> Optional[dict[str, Any]]:
         row = await self.db.payment_requests.find_one(
             {"user_id": int(user_id), "status": {"$in": ["pending", "submitted"]}},
-            {"_id": 0},
+            _PAYMENT_FIELDS,
             sort=[("id", -1)],
         )
         if not row:
             return None
-        return {
-            "id": int(row["id"]),
-            "user_id": int(row["user_id"]),
-            "plan_key": row["plan_key"],
-            "plan_days": int(row["plan_days"]),
-            "amount_rs": int(row["amount_rs"]),
-            "projected_premium_until": int(row.get("projected_premium_until") or 0),
-            "status": row["status"],
-            "utr_text": row.get("utr_text"),
-            "user_chat_id": int(row["user_chat_id"]) if row.get("user_chat_id") is not None else None,
-            "details_msg_id": int(row["details_msg_id"]) if row.get("details_msg_id") is not None else None,
-            "qr_msg_id": int(row["qr_msg_id"]) if row.get("qr_msg_id") is not None else None,
-            "expires_at": int(row.get("expires_at") or 0),
-            "created_at": int(row["created_at"]),
-            "updated_at": int(row["updated_at"]),
-            "processed_by": row.get("processed_by"),
-            "processed_at": row.get("processed_at"),
-            "gateway_extra": row.get("gateway_extra"),
-        }
+        return _payment_doc(row)
 
     async def set_payment_ui_messages(self, request_id: int, user_chat_id: int, details_msg_id: int, qr_msg_id: int | None) -> None:
         now = _now()
@@ -743,41 +957,53 @@ class MongoDatabase:
             {"$set": {"gateway_extra": gateway_extra, "updated_at": now}},
         )
 
-    async def expire_payment_request_if_pending(self, request_id: int) -> bool:
+    async def _transition_payment(
+        self,
+        request_id: int,
+        from_states: tuple[str, ...],
+        to_state: str,
+        extra_match: dict[str, Any] | None = None,
+        **fields: Any,
+    ) -> bool:
+        # Single conditional update for every status change: the state check
+        # and the write are one atomic operation, so callers never need to
+        # read the status first.
         now = _now()
+        query: dict[str, Any] = {"id": int(request_id), "status": {"$in": list(from_states)}}
+        if extra_match:
+            query.update(extra_match)
         res = await self.db.payment_requests.update_one(
-            {
-                "id": int(request_id),
-                "status": "pending",
-                "$or": [{"utr_text": None}, {"utr_text": ""}],
-            },
-            {"$set": {"status": "expired", "updated_at": now}},
+            query,
+            {"$set": {"status": to_state, "updated_at": now, **fields}},
         )
         return bool(res.modified_count > 0)
 
+    async def expire_payment_request_if_pending(self, request_id: int) -> bool:
+        return await self._transition_payment(
+            request_id, ("pending",), "expired", extra_match={"$or": [{"utr_text": None}, {"utr_text": ""}]}
+        )
+
     async def approve_payment_request(self, request_id: int, admin_id: int) -> bool:
         now = _now()
-        res = await self.db.payment_requests.update_one(
-            {"id": int(request_id), "status": {"$in": ["submitted", "pending"]}},
-            {"$set": {"status": "processed", "processed_by": int(admin_id), "processed_at": now, "updated_at": now}},
+        return await self._transition_payment(
+            request_id, ("submitted", "pending"), "processed", processed_by=int(admin_id), processed_at=now
         )
-        return bool(res.modified_count > 0)
 
     async def force_approve_payment_request(self, request_id: int, admin_id: int) -> bool:
         now = _now()
-        res = await self.db.payment_requests.update_one(
-            {"id": int(request_id), "status": {"$ne": "processed"}},
-            {"$set": {"status": "processed", "processed_by": int(admin_id), "processed_at": now, "updated_at": now}},
+        return await self._transition_payment(
+            request_id,
+            ("pending", "submitted", "rejected", "expired"),
+            "processed",
+            processed_by=int(admin_id),
+            processed_at=now,
         )
-        return bool(res.modified_count > 0)
 
     async def reject_payment_request(self, request_id: int, admin_id: int) -> bool:
         now = _now()
-        res = await self.db.payment_requests.update_one(
-            {"id": int(request_id), "status": {"$in": ["submitted", "pending"]}},
-            {"$set": {"status": "rejected", "processed_by": int(admin_id), "processed_at": now, "updated_at": now}},
+        return await self._transition_payment(
+            request_id, ("submitted", "pending"), "rejected", processed_by=int(admin_id), processed_at=now
         )
-        return bool(res.modified_count > 0)
 
     async def delete_payment_request(self, request_id: int) -> None:
         await self.db.payment_requests.delete_one({"id": int(request_id)})
@@ -791,7 +1017,7 @@ class MongoDatabase:
                     "$lte": int(until_ts),
                 },
             },
-            {"_id": 0, "id": 1, "user_id": 1, "plan_key": 1, "plan_days": 1, "amount_rs": 1, "processed_at": 1},
+            _PROCESSED_PAYMENT_FIELDS,
         ).sort([("processed_at", 1), ("id", 1)])
         out: list[dict[str, Any]] = []
         async for r in rows:
@@ -816,56 +1042,28 @@ class MongoDatabase:
                     "$lte": int(until_ts),
                 },
             },
-            {"_id": 0},
+            _PAYMENT_FIELDS,
         ).sort([("processed_at", 1), ("id", 1)])
-        out: list[dict[str, Any]] = []
-        async for row in rows:
-            out.append({
-                "id": int(row["id"]),
-                "user_id": int(row["user_id"]),
-                "plan_key": row["plan_key"],
-                "plan_days": int(row["plan_days"]),
-                "amount_rs": int(row["amount_rs"]),
-                "projected_premium_until": int(row.get("projected_premium_until") or 0),
-                "status": row["status"],
-                "utr_text": row.get("utr_text"),
-                "user_chat_id": int(row["user_chat_id"]) if row.get("user_chat_id") is not None else None,
-                "details_msg_id": int(row["details_msg_id"]) if row.get("details_msg_id") is not None else None,
-                "qr_msg_id": int(row["qr_msg_id"]) if row.get("qr_msg_id") is not None else None,
-                "expires_at": int(row.get("expires_at") or 0),
-                "created_at": int(row["created_at"]),
-                "updated_at": int(row["updated_at"]),
-                "processed_by": row.get("processed_by"),
-                "processed_at": row.get("processed_at"),
-                "gateway_extra": row.get("gateway_extra"),
-            })
-        return out
+        return [_payment_doc(row) async for row in rows]
 
 
     async def list_pending_payment_requests(self) -> list[dict[str, Any]]:
-        rows = self.db.payment_requests.find({"status": "pending"}, {"_id": 0})
-        out: list[dict[str, Any]] = []
-        async for row in rows:
-            out.append({
-                "id": int(row["id"]),
-                "user_id": int(row["user_id"]),
-                "plan_key": row["plan_key"],
-                "plan_days": int(row["plan_days"]),
-                "amount_rs": int(row["amount_rs"]),
-                "projected_premium_until": int(row.get("projected_premium_until") or 0),
-                "status": row["status"],
-                "utr_text": row.get("utr_text"),
-                "user_chat_id": int(row["user_chat_id"]) if row.get("user_chat_id") is not None else None,
-                "details_msg_id": int(row["details_msg_id"]) if row.get("details_msg_id") is not None else None,
-                "qr_msg_id": int(row["qr_msg_id"]) if row.get("qr_msg_id") is not None else None,
-                "expires_at": int(row.get("expires_at") or 0),
-                "created_at": int(row["created_at"]),
-                "updated_at": int(row["updated_at"]),
-                "processed_by": row.get("processed_by"),
-                "processed_at": row.get("processed_at"),
-                "gateway_extra": row.get("gateway_extra"),
-            })
-        return out
+        rows = self.db.payment_requests.find({"status": "pending"}, _PAYMENT_FIELDS)
+        return [_payment_doc(row) async for row in rows]
+
+    async def list_expired_pending_payment_requests(self) -> list[dict[str, Any]]:
+        # Overdue manual orders only: gateway orders (gateway_extra set) are
+        # expired by their own pollers.
+        rows = self.db.payment_requests.find(
+            {
+                "status": "pending",
+                "expires_at": {"$lte": _now()},
+                "gateway_extra": None,
+                "$or": [{"utr_text": None}, {"utr_text": ""}],
+            },
+            _PAYMENT_FIELDS,
+        )
+        return [_payment_doc(row) async for row in rows]
 
     async def bulk_expire_expired_payment_requests(self) -> int:
         now = _now()
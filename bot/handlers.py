@@ -2,7 +2,11 @@ from __future__ import annotations
 
 import asyncio
 import datetime
+import functools
+import heapq
 import html
+import io
+import itertools
 import json
 import logging
 import os
@@ -13,8 +17,19 @@ from typing import Any, Optional
 from urllib.parse import parse_qs, quote, urlparse
 
 import httpx
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, MessageEntity, Update, LabeledPrice, BotCommand
-from telegram.constants import ChatMemberStatus, MessageEntityType
+from telegram import (
+    Bot,
+    BotCommand,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaAudio,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo,
+    LabeledPrice,
+    Update,
+)
+from telegram.constants import ChatMemberStatus
 from telegram.error import Forbidden, RetryAfter
 from telegram.ext import (
     Application,
@@ -34,9 +49,23 @@ from bot.security import new_code, new_token
 from bot import xwallet_service
 from bot import razorpay_service
 
+try:
+    import orjson
+except ImportError:  # optional; falls back to stdlib json
+    orjson = None
+
+try:
+    import segno
+except ImportError:  # optional; falls back to a remote QR image URL
+    segno = None
+
 
 DAY_SECONDS = 24 * 60 * 60
 MAX_CHANNEL_BATCH_POSTS = 200
+COPY_MESSAGES_CHUNK = 100  # Bot API limit for copyMessages
+DELETE_MESSAGES_CHUNK = 100  # Bot API limit for deleteMessages
+MEDIA_GROUP_MAX = 10  # Bot API limit for sendMediaGroup (minimum is 2)
+PAYMENT_EXPIRY_SWEEP_SECONDS = 30
 BROADCAST_CONCURRENCY = 40
 BROADCAST_RETRY_LIMIT = 2
 FORCE_JOIN_CHECK_CONCURRENCY = 6
@@ -52,8 +81,28 @@ SETTINGS_PREMIUM_CHANNELS = "premium_channels"
 UI_EMOJI_CACHE_KEY = "_ui_emoji_map_cache"
 UI_EMOJI_CACHE_TS_KEY = "_ui_emoji_map_cache_ts"
 UI_EMOJI_CACHE_TTL_SECONDS = 120
+UI_EMOJI_CACHE_LOCK_KEY = "_ui_emoji_map_lock"
+UI_EMOJI_CHAR_CACHE_KEY = "_ui_emoji_char_map_cache"
+AUTODELETE_HEAP_KEY = "_autodelete_heap"
+AUTODELETE_WAKE_KEY = "_autodelete_wake"
+AUTODELETE_TASK_KEY = "_autodelete_task"
+UI_TEXT_CACHE_KEY = "_ui_text_html_cache"
+UI_TEXT_CACHE_MAX = 512
 logger = logging.getLogger(__name__)
 from bot.deployment import RUNNING_SUB_BOTS
+
+
+def _json_loads(raw: str | bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _json_dumps(obj: Any) -> str:
+    # Compact output either way, so stored values look the same with or without orjson.
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
 PRESET_UI_EMOJI_IDS = {
     "info": "6059839048065750021",
     "timer": "5440621591387980068",
@@ -81,6 +130,12 @@ PRESET_UI_EMOJI_IDS = {
     "receipt": "5032963696746300412",
     "premium_star": "5202218878888850186",
 }
+# Preset ids normalised once; invalid presets map to "" (no custom emoji).
+_PRESET_UI_EMOJI_CLEAN: dict[str, str] = {
+    name: (val or "").strip() if (val or "").strip().isdigit() else "" for name, val in PRESET_UI_EMOJI_IDS.items()
+}
+# Settings keys per preset name, in the same order as PRESET_UI_EMOJI_IDS.
+_UI_EMOJI_SETTING_KEYS: dict[str, str] = {name: f"{SETTINGS_UI_EMOJI_PREFIX}{name}" for name in PRESET_UI_EMOJI_IDS}
 UNICODE_TO_UI_NAME = {
     "ℹ": "info",
     "⏱": "timer",
@@ -108,6 +163,9 @@ UNICODE_TO_UI_NAME = {
     "🧾": "receipt",
     "⭐": "premium_star",
 }
+# Any UI emoji character, with its optional VS16 (U+FE0F) variation selector.
+_UI_EMOJI_RE = re.compile("[" + "".join(re.escape(c) for c in UNICODE_TO_UI_NAME) + "]\ufe0f?")
+_HTML_TAG_SPLIT_RE = re.compile(r"(<[^>]*>)")
 
 _SMALL_CAPS_MAP = {
     'a': 'ᴀ', 'b': 'ʙ', 'c': 'ᴄ', 'd': 'ᴅ', 'e': 'ᴇ', 'f': 'ꜰ', 'g': 'ɢ', 'h': 'ʜ', 'i': 'ɪ', 'j': 'ᴊ', 'k': 'ᴋ', 'l': 'ʟ', 'm': 'ᴍ', 'n': 'ɴ', 'o': 'ᴏ', 'p': 'ᴘ', 'q': 'Q', 'r': 'ʀ', 's': 'ꜱ', 't': 'ᴛ', 'u': 'ᴜ', 'v': 'ᴠ', 'w': 'ᴡ', 'x': 'x', 'y': 'ʏ', 'z': 'ᴢ',
@@ -137,6 +195,9 @@ ICON_REPLACEMENTS = {
 }
 
 def _convert_square_brackets_to_html(text: str) -> str:
+    # Every marker starts with "[", so text without one has nothing to replace.
+    if "[" not in text:
+        return text
     replacements = {
         "[b]": "<b>", "[/b]": "</b>",
         "[i]": "<i>", "[/i]": "</i>",
@@ -397,6 +458,16 @@ BSETTINGS_DOCS: dict[str, dict[str, str]] = {
     },
 }
 
+# Doc pages are constant; compose them once so each panel open reuses the same
+# string (and its cached hash) as the key into the UI text render caches.
+BSETTINGS_DOC_TEXTS: dict[str, str] = {
+    key: f"{doc['title']}\n\n{doc['body']}" for key, doc in BSETTINGS_DOCS.items()
+}
+
+
+# Panel keyboards are static per argument and PTB objects are frozen, so one
+# instance per variant is built and reused across renders.
+@functools.lru_cache(maxsize=4)
 def _bsettings_keyboard(is_maintenance: bool = False) -> InlineKeyboardMarkup:
     # Intentionally exclude /getlink, /batch, /custombatch from this panel.
     m_label = "🚧 ᴍᴀɪɴᴛᴇɴᴀɴᴄᴇ: ᴏɴ" if is_maintenance else "🚧 ᴍᴀɪɴᴛᴇɴᴀɴᴄᴇ: ᴏꜰꜰ"
@@ -436,6 +507,7 @@ def _bsettings_keyboard(is_maintenance: bool = False) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@functools.lru_cache(maxsize=None)
 def _bset_premiumch_panel_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         [
@@ -478,6 +550,7 @@ async def _bset_premiumch_panel_text(db: Database) -> str:
 
 
 
+@functools.lru_cache(maxsize=None)
 def _bset_forcech_panel_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         [
@@ -509,6 +582,7 @@ def _bset_forcech_panel_text() -> str:
     )
 
 
+@functools.lru_cache(maxsize=16)
 def _bset_setpay_keyboard(gateway: str = "manual") -> InlineKeyboardMarkup:
     def active_indicator(g: str) -> str:
         return " ✔" if gateway == g else ""
@@ -565,25 +639,24 @@ def _clear_bsettings_wait_states(context: ContextTypes.DEFAULT_TYPE) -> None:
         context.user_data.pop(k, None)
 
 
-def _welcome_text() -> str:
-    return (
-        "🤖 <b>ꜱᴇᴄᴜʀᴇ ꜰɪʟᴇ ꜱᴛᴏʀᴇ & ᴅɪꜱᴛʀɪʙᴜᴛɪᴏɴ ʙᴏᴛ</b>\n"
-        "━━━━━━━━━━━━━━\n\n"
-        "<blockquote>👋 ᴀᴅᴠᴀɴᴄᴇᴅ ꜰɪʟᴇ ᴅɪꜱᴛʀɪʙᴜᴛɪᴏɴ ʙᴏᴛ — ꜱᴛᴏʀᴇ & ᴅᴇʟɪᴠᴇʀ ꜰɪʟᴇꜱ ꜱᴇᴄᴜʀᴇʟʏ ᴠɪᴀ ᴅᴇᴇᴘ-ʟɪɴᴋꜱ.</blockquote>\n\n"
-        "📦 <b>ꜰᴇᴀᴛᴜʀᴇꜱ</b>\n"
-        "▸ <b>ɪɴꜱᴛᴀɴᴛ ᴅᴇʟɪᴠᴇʀʏ</b> via deep-links\n"
-        "▸ <b>ꜰᴏʀᴄᴇ-ᴊᴏɪɴ ᴠᴇʀɪꜰɪᴄᴀᴛɪᴏɴ</b> before access\n"
-        "▸ <b>ᴘʀᴇᴍɪᴜᴍ ᴠɪᴘ</b>: No ads, higher daily quota\n\n"
-        "📌 <b>ʜᴏᴡ ᴛᴏ ɢᴇᴛ ꜰɪʟᴇꜱ</b>\n"
-        "1️⃣ Click the deep-link\n"
-        "2️⃣ Complete channel join if required\n"
-        "3️⃣ Tap <b>ʀᴇᴄʜᴇᴄᴋ ✅</b> to receive files!\n\n"
-        "💎 <b>ᴄᴏᴍᴍᴀɴᴅꜱ</b>\n"
-        "<code>/plan</code> · <code>/pay</code> · <code>/redeem</code> · <code>/cancel</code>\n\n"
-        "<blockquote expandable>⚠️ Forwarded links won't work — click original link only.</blockquote>\n"
-        "━━━━━━━━━━━━━━\n"
-        "✨ <i>Unlock next-level file distribution today!</i>"
-    )
+WELCOME_TEXT = (
+    "🤖 <b>ꜱᴇᴄᴜʀᴇ ꜰɪʟᴇ ꜱᴛᴏʀᴇ & ᴅɪꜱᴛʀɪʙᴜᴛɪᴏɴ ʙᴏᴛ</b>\n"
+    "━━━━━━━━━━━━━━\n\n"
+    "<blockquote>👋 ᴀᴅᴠᴀɴᴄᴇᴅ ꜰɪʟᴇ ᴅɪꜱᴛʀɪʙᴜᴛɪᴏɴ ʙᴏᴛ — ꜱᴛᴏʀᴇ & ᴅᴇʟɪᴠᴇʀ ꜰɪʟᴇꜱ ꜱᴇᴄᴜʀᴇʟʏ ᴠɪᴀ ᴅᴇᴇᴘ-ʟɪɴᴋꜱ.</blockquote>\n\n"
+    "📦 <b>ꜰᴇᴀᴛᴜʀᴇꜱ</b>\n"
+    "▸ <b>ɪɴꜱᴛᴀɴᴛ ᴅᴇʟɪᴠᴇʀʏ</b> via deep-links\n"
+    "▸ <b>ꜰᴏʀᴄᴇ-ᴊᴏɪɴ ᴠᴇʀɪꜰɪᴄᴀᴛɪᴏɴ</b> before access\n"
+    "▸ <b>ᴘʀᴇᴍɪᴜᴍ ᴠɪᴘ</b>: No ads, higher daily quota\n\n"
+    "📌 <b>ʜᴏᴡ ᴛᴏ ɢᴇᴛ ꜰɪʟᴇꜱ</b>\n"
+    "1️⃣ Click the deep-link\n"
+    "2️⃣ Complete channel join if required\n"
+    "3️⃣ Tap <b>ʀᴇᴄʜᴇᴄᴋ ✅</b> to receive files!\n\n"
+    "💎 <b>ᴄᴏᴍᴍᴀɴᴅꜱ</b>\n"
+    "<code>/plan</code> · <code>/pay</code> · <code>/redeem</code> · <code>/cancel</code>\n\n"
+    "<blockquote expandable>⚠️ Forwarded links won't work — click original link only.</blockquote>\n"
+    "━━━━━━━━━━━━━━\n"
+    "✨ <i>Unlock next-level file distribution today!</i>"
+)
 
 
 
@@ -619,14 +692,11 @@ def _now() -> int:
     return int(time.time())
 
 
-def _u16len(s: str) -> int:
-    return len(s.encode("utf-16-le")) // 2
-
-
 def _invalidate_ui_emoji_cache(context: ContextTypes.DEFAULT_TYPE) -> None:
     bd = context.application.bot_data
     bd.pop(UI_EMOJI_CACHE_KEY, None)
     bd.pop(UI_EMOJI_CACHE_TS_KEY, None)
+    bd.pop(UI_EMOJI_CHAR_CACHE_KEY, None)
 
 
 async def _get_ui_emoji_map(context: ContextTypes.DEFAULT_TYPE) -> dict[str, str]:
@@ -636,150 +706,91 @@ async def _get_ui_emoji_map(context: ContextTypes.DEFAULT_TYPE) -> dict[str, str
     if isinstance(cached, dict) and (time.time() - cached_at) < UI_EMOJI_CACHE_TTL_SECONDS:
         return cached
 
-    db: Database = bd["db"]
-    name_to_id: dict[str, str] = {}
-    for name, preset in PRESET_UI_EMOJI_IDS.items():
-        v = await db.get_setting(f"{SETTINGS_UI_EMOJI_PREFIX}{name}")
-        db_val = (v or "").strip()
-        preset_val = (preset or "").strip()
-        if db_val.isdigit():
-            name_to_id[name] = db_val
-        elif preset_val.isdigit():
-            name_to_id[name] = preset_val
-        else:
-            name_to_id[name] = ""
-
-    bd[UI_EMOJI_CACHE_KEY] = name_to_id
-    bd[UI_EMOJI_CACHE_TS_KEY] = time.time()
-    return name_to_id
-
-
-async def _build_custom_emoji_entities(text: str, context: ContextTypes.DEFAULT_TYPE) -> list[MessageEntity]:
-    name_to_id = await _get_ui_emoji_map(context)
-
-    entities: list[MessageEntity] = []
-    off = 0
-    i = 0
-    vs16 = "\ufe0f"
-    while i < len(text):
-        ch = text[i]
-        token = ch
-        step = 1
-        # Handle variation-selector style emoji sequences like "ℹ️", "⚠️", "🗑️".
-        if i + 1 < len(text) and text[i + 1] == vs16:
-            token = ch + text[i + 1]
-            step = 2
-
-        name = UNICODE_TO_UI_NAME.get(ch)
-        if name:
-            eid = name_to_id.get(name)
-            if eid and eid.isdigit():
-                entities.append(
-                    MessageEntity(
-                        type=MessageEntityType.CUSTOM_EMOJI,
-                        offset=off,
-                        length=_u16len(token),
-                        custom_emoji_id=eid,
-                    )
-                )
-        off += _u16len(token)
-        i += step
-    return entities
-
-
-def _extract_style_entities(raw_text: str) -> tuple[str, list[MessageEntity]]:
-    marker_to_type = {
-        "[b]": MessageEntityType.BOLD,
-        "[i]": MessageEntityType.ITALIC,
-        "[u]": MessageEntityType.UNDERLINE,
-        "[c]": MessageEntityType.CODE,
-        "[q]": MessageEntityType.BLOCKQUOTE,
-        "[eq]": MessageEntityType.EXPANDABLE_BLOCKQUOTE,
-    }
-    closing_to_open = {
-        "[/b]": "[b]",
-        "[/i]": "[i]",
-        "[/u]": "[u]",
-        "[/c]": "[c]",
-        "[/q]": "[q]",
-        "[/eq]": "[eq]",
-    }
-    markers = sorted(list(marker_to_type.keys()) + list(closing_to_open.keys()), key=len, reverse=True)
-
-    out: list[str] = []
-    entities: list[MessageEntity] = []
-    stack: list[tuple[str, int]] = []
-    i = 0
-    off = 0
-    while i < len(raw_text):
-        matched = None
-        for mk in markers:
-            if raw_text.startswith(mk, i):
-                matched = mk
-                break
-        if not matched:
-            ch = raw_text[i]
-            out.append(ch)
-            off += _u16len(ch)
-            i += 1
-            continue
+    # Only one caller rebuilds after the TTL flips; the rest reuse its result.
+    lock = bd.setdefault(UI_EMOJI_CACHE_LOCK_KEY, asyncio.Lock())
+    async with lock:
+        cached = bd.get(UI_EMOJI_CACHE_KEY)
+        cached_at = float(bd.get(UI_EMOJI_CACHE_TS_KEY, 0) or 0)
+        if isinstance(cached, dict) and (time.time() - cached_at) < UI_EMOJI_CACHE_TTL_SECONDS:
+            return cached
+
+        db: Database = bd["db"]
+        values = await db.get_settings_many(list(_UI_EMOJI_SETTING_KEYS.values()))
+        name_to_id: dict[str, str] = {}
+        for name, key in _UI_EMOJI_SETTING_KEYS.items():
+            db_val = (values.get(key) or "").strip()
+            name_to_id[name] = db_val if db_val.isdigit() else _PRESET_UI_EMOJI_CLEAN[name]
+
+        # Fused char -> id table (only chars with a usable id) for the render paths.
+        bd[UI_EMOJI_CHAR_CACHE_KEY] = {
+            ch: name_to_id[name] for ch, name in UNICODE_TO_UI_NAME.items() if name_to_id.get(name)
+        }
+        bd[UI_EMOJI_CACHE_KEY] = name_to_id
+        bd[UI_EMOJI_CACHE_TS_KEY] = time.time()
+        return name_to_id
 
-        if matched in marker_to_type:
-            stack.append((matched, off))
-        else:
-            expected_open = closing_to_open[matched]
-            if stack and stack[-1][0] == expected_open:
-                open_mk, start_off = stack.pop()
-                if off > start_off:
-                    entities.append(
-                        MessageEntity(
-                            type=marker_to_type[open_mk],
-                            offset=start_off,
-                            length=off - start_off,
-                        )
-                    )
-            else:
-                # Unbalanced closing marker: keep it as literal text.
-                out.append(matched)
-                off += _u16len(matched)
-        i += len(matched)
 
-    return "".join(out), entities
+async def _get_ui_emoji_char_map(context: ContextTypes.DEFAULT_TYPE) -> dict[str, str]:
+    await _get_ui_emoji_map(context)
+    return context.application.bot_data.get(UI_EMOJI_CHAR_CACHE_KEY) or {}
 
 
 async def _format_custom_emojis_html(html_text: str, context: ContextTypes.DEFAULT_TYPE) -> str:
     if not html_text:
         return ""
-    name_to_id = await _get_ui_emoji_map(context)
-    vs16 = "\ufe0f"
-    tokens = re.split(r'(<[^>]*>)', html_text)
-    new_tokens = []
-    for token in tokens:
-        if token.startswith('<') and token.endswith('>'):
-            new_tokens.append(token)
-        else:
-            out_chars = []
-            i = 0
-            while i < len(token):
-                ch = token[i]
-                step = 1
-                emoji_token = ch
-                if i + 1 < len(token) and token[i + 1] == vs16:
-                    emoji_token = ch + vs16
-                    step = 2
-                
-                name = UNICODE_TO_UI_NAME.get(ch)
-                if name:
-                    eid = name_to_id.get(name)
-                    if eid and eid.isdigit():
-                        out_chars.append(f'<tg-emoji emoji-id="{eid}">{emoji_token}</tg-emoji>')
-                    else:
-                        out_chars.append(emoji_token)
-                else:
-                    out_chars.append(ch)
-                i += step
-            new_tokens.append("".join(out_chars))
-    return "".join(new_tokens)
+    # UI emoji are all non-ASCII; plain ASCII text (or text without any) needs no scan.
+    if html_text.isascii() or not _UI_EMOJI_RE.search(html_text):
+        return html_text
+    char_to_id = await _get_ui_emoji_char_map(context)
+
+    def _wrap(m: re.Match[str]) -> str:
+        token = m.group()
+        eid = char_to_id.get(token[0])
+        if eid:
+            return f'<tg-emoji emoji-id="{eid}">{token}</tg-emoji>'
+        return token
+
+    tokens = _HTML_TAG_SPLIT_RE.split(html_text)
+    # Odd indexes are the captured tags; only text between them is scanned, and
+    # text already inside a <tg-emoji> is left alone so re-formatting is a no-op.
+    in_emoji = False
+    for i, tok in enumerate(tokens):
+        if i % 2:
+            if tok.startswith("<tg-emoji"):
+                in_emoji = True
+            elif tok == "</tg-emoji>":
+                in_emoji = False
+        elif tok and not in_emoji:
+            tokens[i] = _UI_EMOJI_RE.sub(_wrap, tok)
+    return "".join(tokens)
+
+
+@functools.lru_cache(maxsize=256)
+def _render_ui_text(text: str) -> str:
+    # Marker -> HTML, icon swaps and small caps are pure in the input, and most
+    # UI texts are the same static panels sent over and over.
+    text = _convert_square_brackets_to_html(text)
+    for old, new in ICON_REPLACEMENTS.items():
+        text = text.replace(old, new)
+    return to_small_caps_auto(text)
+
+
+async def _format_ui_text(text: str, context: ContextTypes.DEFAULT_TYPE) -> str:
+    # Final HTML per text, valid for one load of the UI emoji map: the cache is
+    # dropped whenever _get_ui_emoji_map() reloads (new timestamp).
+    html_text = _render_ui_text(text)
+    await _get_ui_emoji_map(context)
+    bd = context.application.bot_data
+    ts = bd.get(UI_EMOJI_CACHE_TS_KEY)
+    cache_ts, cache = bd.get(UI_TEXT_CACHE_KEY) or (None, {})
+    if cache_ts != ts or len(cache) >= UI_TEXT_CACHE_MAX:
+        cache = {}
+        bd[UI_TEXT_CACHE_KEY] = (ts, cache)
+    formatted = cache.get(html_text)
+    if formatted is None:
+        formatted = await _format_custom_emojis_html(html_text, context)
+        cache[html_text] = formatted
+    return formatted
 
 
 async def _send_emoji_text(
@@ -789,11 +800,7 @@ async def _send_emoji_text(
     reply_markup: Optional[InlineKeyboardMarkup] = None,
     disable_web_page_preview: Optional[bool] = None,
 ) -> Any:
-    text = _convert_square_brackets_to_html(text)
-    for old, new in ICON_REPLACEMENTS.items():
-        text = text.replace(old, new)
-    text = to_small_caps_auto(text)
-    formatted_text = await _format_custom_emojis_html(text, context)
+    formatted_text = await _format_ui_text(text, context)
     return await context.bot.send_message(
         chat_id=chat_id,
         text=formatted_text,
@@ -811,11 +818,7 @@ async def _edit_emoji_text(
     reply_markup: Optional[InlineKeyboardMarkup] = None,
     disable_web_page_preview: Optional[bool] = None,
 ) -> Any:
-    text = _convert_square_brackets_to_html(text)
-    for old, new in ICON_REPLACEMENTS.items():
-        text = text.replace(old, new)
-    text = to_small_caps_auto(text)
-    formatted_text = await _format_custom_emojis_html(text, context)
+    formatted_text = await _format_ui_text(text, context)
     return await context.bot.edit_message_text(
         chat_id=chat_id,
         message_id=message_id,
@@ -833,11 +836,7 @@ async def _send_html_text(
     reply_markup: Optional[InlineKeyboardMarkup] = None,
     disable_web_page_preview: Optional[bool] = None,
 ) -> Any:
-    html_text = _convert_square_brackets_to_html(html_text)
-    for old, new in ICON_REPLACEMENTS.items():
-        html_text = html_text.replace(old, new)
-    html_text = to_small_caps_auto(html_text)
-    formatted_text = await _format_custom_emojis_html(html_text, context)
+    formatted_text = await _format_ui_text(html_text, context)
     return await context.bot.send_message(
         chat_id=chat_id,
         text=formatted_text,
@@ -880,39 +879,63 @@ def _pay_admin_msgs_key(request_id: int) -> str:
     return f"{SETTINGS_PAY_ADMIN_MSGS_PREFIX}{int(request_id)}"
 
 
-async def _save_pay_admin_msg_ref(db: Database, request_id: int, chat_id: int, message_id: int) -> None:
-    key = _pay_admin_msgs_key(request_id)
-    raw = (await db.get_setting(key)) or "[]"
-    try:
-        refs = json.loads(raw)
-        if not isinstance(refs, list):
-            refs = []
-    except Exception:
-        refs = []
-    ref = [int(chat_id), int(message_id)]
-    if ref not in refs:
-        refs.append(ref)
-    await db.set_setting(key, json.dumps(refs, separators=(",", ":")))
+# Live mirror of the persisted admin message refs per payment request.
+_PAY_ADMIN_MSG_REFS: dict[int, set[tuple[int, int]]] = {}
 
 
-async def _get_pay_admin_msg_refs(db: Database, request_id: int) -> list[tuple[int, int]]:
+async def _load_pay_admin_msg_refs(db: Database, request_id: int) -> set[tuple[int, int]]:
+    refs = _PAY_ADMIN_MSG_REFS.get(int(request_id))
+    if refs is not None:
+        return refs
     raw = (await db.get_setting(_pay_admin_msgs_key(request_id))) or "[]"
     try:
-        refs = json.loads(raw)
+        items = _json_loads(raw)
     except Exception:
-        refs = []
-    out: list[tuple[int, int]] = []
-    if isinstance(refs, list):
-        for item in refs:
+        items = []
+    refs = set()
+    if isinstance(items, list):
+        for item in items:
             if isinstance(item, list) and len(item) == 2:
                 try:
-                    out.append((int(item[0]), int(item[1])))
+                    refs.add((int(item[0]), int(item[1])))
                 except Exception:
                     pass
-    return out
+    return _PAY_ADMIN_MSG_REFS.setdefault(int(request_id), refs)
+
+
+async def _persist_pay_admin_msg_refs(db: Database, request_id: int) -> None:
+    refs = _PAY_ADMIN_MSG_REFS.get(int(request_id))
+    if not refs:
+        return
+    await db.set_setting(
+        _pay_admin_msgs_key(request_id),
+        _json_dumps([list(r) for r in sorted(refs)]),
+    )
+
+
+async def _save_pay_admin_msg_ref(
+    db: Database, request_id: int, chat_id: int, message_id: int, persist: bool = True
+) -> None:
+    refs = await _load_pay_admin_msg_refs(db, request_id)
+    ref = (int(chat_id), int(message_id))
+    if ref in refs:
+        return
+    refs.add(ref)
+    if persist:
+        await _persist_pay_admin_msg_refs(db, request_id)
+
+
+async def _get_pay_admin_msg_refs(db: Database, request_id: int) -> list[tuple[int, int]]:
+    return list(await _load_pay_admin_msg_refs(db, request_id))
+
+
+def _drop_pay_admin_msg_refs(request_id: int) -> None:
+    # Request reached a final state; its admin messages won't be edited again.
+    _PAY_ADMIN_MSG_REFS.pop(int(request_id), None)
 
 
 async def _clear_pay_admin_msg_refs(db: Database, request_id: int) -> None:
+    _drop_pay_admin_msg_refs(request_id)
     await db.set_setting(_pay_admin_msgs_key(request_id), None)
 
 
@@ -923,20 +946,32 @@ async def _sync_pay_admin_status(
 ) -> None:
     db: Database = context.application.bot_data["db"]
     refs = await _get_pay_admin_msg_refs(db, request_id)
-    for chat_id, message_id in refs:
-        try:
-            await _edit_emoji_text(chat_id, message_id, text, context)
-        except Exception:
-            pass
+    if refs:
+        # Same text for every admin: format once, then edit all copies concurrently.
+        formatted_text = await _format_ui_text(text, context)
+        await asyncio.gather(
+            *(
+                context.bot.edit_message_text(
+                    chat_id=chat_id, message_id=message_id, text=formatted_text, parse_mode="HTML"
+                )
+                for chat_id, message_id in refs
+            ),
+            return_exceptions=True,
+        )
     await _clear_pay_admin_msg_refs(db, request_id)
 
 
+_START_CODE_RE = re.compile(r"[A-Za-z0-9_-]{6,128}")
+_INVIS_TRANS = str.maketrans("", "", "\u200b\u200c\u200d\ufeff")
+
+
+@functools.lru_cache(maxsize=4096)
 def _normalize_start_code(raw: str) -> str:
     s = (raw or "").strip()
     if not s:
         return ""
     # Remove common invisible chars from copy/paste.
-    s = s.replace("\u200b", "").replace("\u200c", "").replace("\u200d", "").replace("\ufeff", "")
+    s = s.translate(_INVIS_TRANS)
 
     # If full URL is provided, extract ?start=...
     if "t.me/" in s and "start=" in s:
@@ -949,17 +984,15 @@ def _normalize_start_code(raw: str) -> str:
             pass
 
     # If fragment includes "start=..."
-    if "start=" in s:
-        try:
-            s = s.split("start=", 1)[1]
-        except Exception:
-            pass
+    idx = s.find("start=")
+    if idx >= 0:
+        s = s[idx + 6:]
 
     # Trim punctuation often included by chat copy.
     s = s.strip(" \t\r\n<>.,;:()[]{}\"'")
 
     # Keep only valid deep-link payload chars if noisy text is pasted.
-    m = re.search(r"[A-Za-z0-9_-]{6,128}", s)
+    m = _START_CODE_RE.search(s)
     return m.group(0) if m else s
 
 
@@ -1026,6 +1059,9 @@ async def _joined_all_force_channels_details(
         return True, [], []
     bot = context.bot
     semaphore = asyncio.Semaphore(FORCE_JOIN_CHECK_CONCURRENCY)
+    # One query for the stored join requests of every request-mode channel.
+    request_cids = [int(ch["channel_id"]) for ch in channels if (ch.get("mode") or "direct").lower() == "request"]
+    requested = await db.has_force_join_requests(user_id, request_cids) if request_cids else set()
 
     async def _check_channel(ch: dict[str, Any]) -> tuple[bool, dict[str, Any], dict[str, Any]]:
         cid = int(ch["channel_id"])
@@ -1046,7 +1082,7 @@ async def _joined_all_force_channels_details(
                 # We can skip the Telegram API call if membership is cached
                 passed = is_joined
                 if mode == "request":
-                    has_request = await db.has_force_join_request(cid, user_id)
+                    has_request = cid in requested
                     passed = bool(has_request or is_joined)
                 return passed, ch, {
                     "channel_id": cid,
@@ -1058,30 +1094,35 @@ async def _joined_all_force_channels_details(
                     "request_api_error": "",
                 }
 
-        async with semaphore:
-            if mode == "request":
-                has_request = await db.has_force_join_request(cid, user_id)
-                if not has_request:
-                    has_request, request_api_err = await _has_pending_join_request_via_api(
-                        cid, user_id, context, invite_link=ch.get("invite_link")
-                    )
-                    if has_request:
-                        # Cache it locally so next checks are fast and resilient.
-                        await db.add_force_join_request(cid, user_id)
+        async def _member_status() -> tuple[bool, str]:
             try:
                 member = await bot.get_chat_member(chat_id=cid, user_id=user_id)
-                is_joined = member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
+                return member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED), ""
             except Exception:
                 # Retry once for transient network/API issues.
                 try:
                     await asyncio.sleep(0.25)
                     member = await bot.get_chat_member(chat_id=cid, user_id=user_id)
-                    is_joined = member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
+                    return member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED), ""
                 except Exception as e2:
                     # If membership check fails, we can still allow request-mode users
                     # if join request was captured via ChatJoinRequest update.
-                    is_joined = False
-                    member_err = f"member_check_failed:{type(e2).__name__}"
+                    return False, f"member_check_failed:{type(e2).__name__}"
+
+        async with semaphore:
+            if mode == "request":
+                has_request = cid in requested
+            if mode == "request" and not has_request:
+                # Pending-request lookup and membership check are independent; run them together.
+                (has_request, request_api_err), (is_joined, member_err) = await asyncio.gather(
+                    _has_pending_join_request_via_api(cid, user_id, context, invite_link=ch.get("invite_link")),
+                    _member_status(),
+                )
+                if has_request:
+                    # Cache it locally so next checks are fast and resilient.
+                    await db.add_force_join_request(cid, user_id)
+            else:
+                is_joined, member_err = await _member_status()
 
         # Update cache
         _FORCE_JOIN_MEMBER_CACHE[(user_id, cid)] = (is_joined, time.time())
@@ -1108,6 +1149,12 @@ async def _joined_all_force_channels_details(
     return (len(missing) == 0), missing, details
 
 
+# Signature probes for get_chat_join_requests, memoized so the TypeError
+# fallbacks are only paid once per process.
+_JOIN_REQ_USER_ID_SUPPORTED: Optional[bool] = None
+_JOIN_REQ_OFFSET_KEY = "offset_requester_user_id"
+
+
 async def _has_pending_join_request_via_api(
     channel_id: int,
     user_id: int,
@@ -1126,31 +1173,38 @@ async def _has_pending_join_request_via_api(
 
     # Fast path: query by user_id directly (supported by Bot API).
     # This avoids scanning hundreds of pending requests and keeps bot responsive.
-    try:
-        kwargs_fast: dict[str, Any] = {"chat_id": channel_id, "user_id": int(user_id), "limit": 1}
-        if invite_link and invite_link.startswith("http"):
-            kwargs_fast["invite_link"] = invite_link
-        reqs = await asyncio.wait_for(fn(**kwargs_fast), timeout=4.0)
-        if reqs:
-            return True, ""
-    except TypeError:
-        # Some PTB versions may not expose user_id parameter; continue with fallback.
-        pass
-    except Exception as e:
-        # Continue with fallback scan; include error only if fallback also fails.
-        fast_err = f"api_error_fast:{type(e).__name__}"
-    else:
-        fast_err = ""
+    async def _fast() -> tuple[bool, str]:
+        global _JOIN_REQ_USER_ID_SUPPORTED
+        if _JOIN_REQ_USER_ID_SUPPORTED is False:
+            return False, ""
+        try:
+            kwargs_fast: dict[str, Any] = {"chat_id": channel_id, "user_id": int(user_id), "limit": 1}
+            if invite_link and invite_link.startswith("http"):
+                kwargs_fast["invite_link"] = invite_link
+            reqs = await asyncio.wait_for(fn(**kwargs_fast), timeout=4.0)
+            _JOIN_REQ_USER_ID_SUPPORTED = True
+            return bool(reqs), ""
+        except TypeError as e:
+            # Some PTB versions may not expose user_id parameter; only then rely
+            # on the scans and stop probing for it.
+            if "'user_id'" in str(e):
+                _JOIN_REQ_USER_ID_SUPPORTED = False
+                return False, ""
+            return False, f"api_error_fast:{type(e).__name__}"
+        except Exception as e:
+            # Include error only if the scans also fail.
+            return False, f"api_error_fast:{type(e).__name__}"
 
     async def _scan(kwargs: dict[str, Any]) -> tuple[bool, str]:
+        global _JOIN_REQ_OFFSET_KEY
         offset: Optional[int] = None
         for _ in range(2):  # keep fallback small to avoid slowdown
             k = dict(kwargs)
             k["chat_id"] = channel_id
             k["limit"] = 100
             if offset is not None:
-                # PTB/Bot API naming changed over versions, try both.
-                k["offset_requester_user_id"] = offset
+                # PTB/Bot API naming changed over versions; remember which one works.
+                k[_JOIN_REQ_OFFSET_KEY] = offset
             try:
                 reqs = await asyncio.wait_for(fn(**k), timeout=4.0)
             except TypeError:
@@ -1158,6 +1212,7 @@ async def _has_pending_join_request_via_api(
                 if "offset_requester_user_id" in k:
                     k.pop("offset_requester_user_id", None)
                     k["offset_user_id"] = offset
+                    _JOIN_REQ_OFFSET_KEY = "offset_user_id"
                 try:
                     reqs = await asyncio.wait_for(fn(**k), timeout=4.0)
                 except Exception as e:
@@ -1180,21 +1235,48 @@ async def _has_pending_join_request_via_api(
             offset = int(last_uid) + 1
         return False, ""
 
-    # First try invite-link scoped search for better accuracy in request mode.
+    # The single-row lookup usually answers on its own; only fan out to the
+    # paged scans when it misses.
+    found, fast_err = await _fast()
+    if found:
+        return True, ""
+
+    # Invite-link scoped scan and global scan are independent, so run them
+    # together and stop at the first positive answer.
+    t_global = asyncio.create_task(_scan({}))
+    pending = {t_global}
     if invite_link and invite_link.startswith("http"):
-        ok, err = await _scan({"invite_link": invite_link})
-        if ok:
-            return True, ""
-        # Continue to global scan if not found.
+        pending.add(asyncio.create_task(_scan({"invite_link": invite_link})))
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.result()[0]:
+                    return True, ""
+    finally:
+        for t in pending:
+            t.cancel()
 
-    ok, err = await _scan({})
-    if ok:
-        return True, ""
+    err = t_global.result()[1]
     if fast_err and not err:
         return False, fast_err
     return False, err
 
 
+# Shared keep-alive client for raw Bot API calls (avoids a TLS handshake per call).
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=5.0,
+            limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60),
+        )
+    return _http_client
+
+
 async def _has_pending_join_request_via_raw_api(
     channel_id: int,
     user_id: int,
@@ -1212,9 +1294,8 @@ async def _has_pending_join_request_via_raw_api(
     if invite_link and invite_link.startswith("http"):
         payload["invite_link"] = invite_link
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            r = await client.post(url, json=payload)
-            data = r.json()
+        r = await _get_http_client().post(url, json=payload)
+        data = r.json()
         if not data.get("ok"):
             return False, f"raw_api_error:{data.get('description', 'unknown')}"
         reqs = data.get("result") or []
@@ -1223,21 +1304,18 @@ async def _has_pending_join_request_via_raw_api(
         return False, f"raw_api_error:{type(e).__name__}"
 
 
+def _join_channel_button(ch: dict[str, Any]) -> InlineKeyboardButton:
+    title = ch.get("title") or str(ch["channel_id"])
+    url = ch.get("invite_link") or (f"https://t.me/{ch['username']}" if ch.get("username") else None)
+    if not url:
+        return InlineKeyboardButton(text=f"🔒 ʀᴇQᴜɪʀᴇᴅ: {title}", callback_data="noop")
+    if (ch.get("mode") or "direct").lower() == "request":
+        return InlineKeyboardButton(text=f"🛂 ꜱᴇɴᴅ ᴊᴏɪɴ ʀᴇQᴜᴇꜱᴛ: {title}", url=url)
+    return InlineKeyboardButton(text=f"📢 ᴊᴏɪɴ ᴄʜᴀɴɴᴇʟ: {title}", url=url)
+
+
 def _join_keyboard(channels: list[dict[str, Any]], recheck_code: str) -> InlineKeyboardMarkup:
-    rows: list[list[InlineKeyboardButton]] = []
-    for ch in channels:
-        title = ch.get("title") or str(ch["channel_id"])
-        mode = (ch.get("mode") or "direct").lower()
-        url = ch.get("invite_link")
-        if not url and ch.get("username"):
-            url = f"https://t.me/{ch['username']}"
-        if url:
-            if mode == "request":
-                rows.append([InlineKeyboardButton(text=f"🛂 ꜱᴇɴᴅ ᴊᴏɪɴ ʀᴇQᴜᴇꜱᴛ: {title}", url=url)])
-            else:
-                rows.append([InlineKeyboardButton(text=f"📢 ᴊᴏɪɴ ᴄʜᴀɴɴᴇʟ: {title}", url=url)])
-        else:
-            rows.append([InlineKeyboardButton(text=f"🔒 ʀᴇQᴜɪʀᴇᴅ: {title}", callback_data="noop")])
+    rows = [[_join_channel_button(ch)] for ch in channels]
     rows.append([InlineKeyboardButton(text="✅ ɪ'ᴠᴇ ᴊᴏɪɴᴇᴅ (ʀᴇᴄʜᴇᴄᴋ)", callback_data=f"recheck:{recheck_code}")])
     return InlineKeyboardMarkup(rows)
 
@@ -1252,22 +1330,21 @@ def _access_link_keyboard(normal_url: str, premium_url: str) -> InlineKeyboardMa
 
 
 
+def _is_ascii_digits(s: str) -> bool:
+    # str.isdigit() alone also accepts e.g. superscripts, which int() rejects.
+    return s.isascii() and s.isdigit()
+
+
 def _parse_channel_ref(s: str) -> Optional[str | int]:
     val = (s or "").strip()
     if not val:
         return None
-    if val.startswith("@") and len(val) > 1:
+    if val[0] == "@" and len(val) > 1:
         return val
-    if val.startswith("-100") and val[1:].isdigit():
-        try:
-            return int(val)
-        except ValueError:
-            return None
-    if val.isdigit() and val.startswith("100"):
-        try:
-            return -int(val)
-        except ValueError:
-            return None
+    if val[:4] == "-100" and _is_ascii_digits(val[1:]):
+        return int(val)
+    if val[:3] == "100" and _is_ascii_digits(val):
+        return -int(val)
     return None
 
 
@@ -1282,31 +1359,110 @@ def _format_duration(seconds: int) -> str:
         return f"{seconds} second(s)"
 
 
+# file_type -> (Bot method, file argument name)
+_SEND_FILE_METHODS: dict[str, tuple[str, str]] = {
+    "document": ("send_document", "document"),
+    "video": ("send_video", "video"),
+    "audio": ("send_audio", "audio"),
+    "photo": ("send_photo", "photo"),
+}
+
+
 async def _send_file(
     chat_id: int,
     file_row: dict[str, Any],
     caption: Optional[str],
     context: ContextTypes.DEFAULT_TYPE,
     send_warning: bool = True,
+    autodelete_seconds: Optional[int] = None,
 ) -> None:
     t = file_row["file_type"]
     fid = file_row["tg_file_id"]
     if caption and len(caption) > 1024:
         caption = caption[:1020] + "..."
-    msg = None
-    if t == "document":
-        msg = await context.bot.send_document(chat_id=chat_id, document=fid, caption=caption, parse_mode="HTML")
-    elif t == "video":
-        msg = await context.bot.send_video(chat_id=chat_id, video=fid, caption=caption, parse_mode="HTML")
-    elif t == "audio":
-        msg = await context.bot.send_audio(chat_id=chat_id, audio=fid, caption=caption, parse_mode="HTML")
-    elif t == "photo":
-        msg = await context.bot.send_photo(chat_id=chat_id, photo=fid, caption=caption, parse_mode="HTML")
-    else:
-        msg = await context.bot.send_document(chat_id=chat_id, document=fid, caption=caption, parse_mode="HTML")
+    # Unknown types are sent as documents.
+    method, kw = _SEND_FILE_METHODS.get(t, _SEND_FILE_METHODS["document"])
+    msg = await getattr(context.bot, method)(chat_id=chat_id, caption=caption, parse_mode="HTML", **{kw: fid})
 
     if msg:
-        await _maybe_schedule_autodelete(msg.chat_id, msg.message_id, context, send_warning=send_warning)
+        await _maybe_schedule_autodelete(
+            msg.chat_id, msg.message_id, context, send_warning=send_warning, seconds=autodelete_seconds
+        )
+
+
+# file_type -> (album kind, InputMedia class). Photos and videos may share an
+# album; documents and audio can only be grouped with their own kind.
+_MEDIA_GROUP_TYPES: dict[str, tuple[str, type]] = {
+    "photo": ("visual", InputMediaPhoto),
+    "video": ("visual", InputMediaVideo),
+    "document": ("document", InputMediaDocument),
+    "audio": ("audio", InputMediaAudio),
+}
+
+
+async def _send_files_grouped(
+    chat_id: int,
+    file_rows: list[dict[str, Any]],
+    caption: Optional[str],
+    context: ContextTypes.DEFAULT_TYPE,
+    autodelete_seconds: int,
+) -> None:
+    # Consecutive files of a compatible kind go out as albums of up to 10 in one
+    # sendMediaGroup call each; order is kept. Autodelete warnings are left to
+    # the caller, as for a plain batch.
+    if caption and len(caption) > 1024:
+        caption = caption[:1020] + "..."
+    groups: list[list[dict[str, Any]]] = []
+    last_kind = None
+    for row in file_rows:
+        # Unknown types are sent as documents, same as _send_file().
+        kind = _MEDIA_GROUP_TYPES.get(row["file_type"], _MEDIA_GROUP_TYPES["document"])[0]
+        if kind != last_kind or len(groups[-1]) >= MEDIA_GROUP_MAX:
+            groups.append([])
+            last_kind = kind
+        groups[-1].append(row)
+
+    for group in groups:
+        sent: Optional[tuple[Any, ...]] = None
+        if len(group) > 1:
+            # Only the first item carries the caption, so clients show it as
+            # the album caption.
+            media = [
+                _MEDIA_GROUP_TYPES.get(row["file_type"], _MEDIA_GROUP_TYPES["document"])[1](
+                    media=row["tg_file_id"], caption=caption if i == 0 else None, parse_mode="HTML"
+                )
+                for i, row in enumerate(group)
+            ]
+            try:
+                sent = await context.bot.send_media_group(chat_id=chat_id, media=media)
+            except RetryAfter as e:
+                await asyncio.sleep(float(getattr(e, "retry_after", 1.0)))
+                try:
+                    sent = await context.bot.send_media_group(chat_id=chat_id, media=media)
+                except Exception:
+                    sent = None
+            except Exception:
+                sent = None
+        if sent is None:
+            for row in group:
+                await _send_file(chat_id, row, caption, context, send_warning=False, autodelete_seconds=autodelete_seconds)
+            continue
+        if autodelete_seconds > 0:
+            for m in sent:
+                _schedule_autodelete(context.application, chat_id, m.message_id, autodelete_seconds)
+
+
+@functools.lru_cache(maxsize=16)
+def _parse_autodelete_seconds(raw: Optional[str]) -> int:
+    # Keyed on the stored string, so a changed setting simply misses the cache.
+    try:
+        return int(raw) if raw is not None else 0
+    except ValueError:
+        return 0
+
+
+async def _get_autodelete_seconds(db: Database) -> int:
+    return _parse_autodelete_seconds(await db.get_setting(SETTINGS_AUTODELETE_SECONDS))
 
 
 async def _maybe_schedule_autodelete(
@@ -1314,13 +1470,11 @@ async def _maybe_schedule_autodelete(
     message_id: int,
     context: ContextTypes.DEFAULT_TYPE,
     send_warning: bool = True,
+    seconds: Optional[int] = None,
 ) -> None:
-    db: Database = context.application.bot_data["db"]
-    raw = await db.get_setting(SETTINGS_AUTODELETE_SECONDS)
-    try:
-        seconds = int(raw) if raw is not None else 0
-    except ValueError:
-        seconds = 0
+    # Batch senders look the setting up once and pass it in.
+    if seconds is None:
+        seconds = await _get_autodelete_seconds(context.application.bot_data["db"])
     if seconds <= 0:
         return
 
@@ -1335,58 +1489,147 @@ async def _maybe_schedule_autodelete(
         except Exception as e:
             logger.warning("Failed to send auto-delete warning: %s", e)
 
-    async def _job() -> None:
+    _schedule_autodelete(
+        context.application,
+        chat_id,
+        message_id,
+        seconds,
+        warning_msg.message_id if warning_msg else None,
+    )
+
+
+# Tie-breaker so heap entries never compare past the sequence number.
+_AUTODELETE_SEQ = itertools.count()
+
+
+def _schedule_autodelete(
+    app: Application,
+    chat_id: int,
+    message_id: int,
+    seconds: int,
+    warning_message_id: Optional[int] = None,
+) -> None:
+    # One worker per application drains a deadline heap instead of one
+    # sleeping task per delivered message.
+    bd = app.bot_data
+    heap = bd.setdefault(AUTODELETE_HEAP_KEY, [])
+    wake = bd.setdefault(AUTODELETE_WAKE_KEY, asyncio.Event())
+    heapq.heappush(
+        heap,
+        (time.monotonic() + seconds, next(_AUTODELETE_SEQ), chat_id, message_id, seconds, warning_message_id),
+    )
+    task = bd.get(AUTODELETE_TASK_KEY)
+    if task is None or task.done():
+        # Plain asyncio task: Application.create_task() tasks are awaited on
+        # stop(), which would block shutdown on this endless loop.
+        bd[AUTODELETE_TASK_KEY] = asyncio.create_task(_autodelete_worker(app))
+    wake.set()
+
+
+async def _delete_messages_bulk(bot: Bot, chat_id: int, message_ids: list[int]) -> None:
+    for i in range(0, len(message_ids), DELETE_MESSAGES_CHUNK):
+        chunk = message_ids[i:i + DELETE_MESSAGES_CHUNK]
         try:
-            await asyncio.sleep(seconds)
-            await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+            await bot.delete_messages(chat_id=chat_id, message_ids=chunk)
         except Exception:
-            pass
+            for mid in chunk:
+                try:
+                    await bot.delete_message(chat_id=chat_id, message_id=mid)
+                except Exception:
+                    pass
 
-        if warning_msg:
+
+async def _autodelete_worker(app: Application) -> None:
+    bd = app.bot_data
+    heap: list[tuple[float, int, int, int, int, Optional[int]]] = bd[AUTODELETE_HEAP_KEY]
+    wake: asyncio.Event = bd[AUTODELETE_WAKE_KEY]
+    context = app.context_types.context(app)
+    while True:
+        wake.clear()
+        delay = heap[0][0] - time.monotonic() if heap else None
+        if delay is None or delay > 0:
             try:
-                deleted_text = (
-                    f"🗑️ [b]Message Deleted[/b]\n\n"
-                    f"Your message has been automatically deleted after {_format_duration(seconds)}."
-                )
-                await _edit_emoji_text(
-                    chat_id=chat_id,
-                    message_id=warning_msg.message_id,
-                    text=deleted_text,
-                    context=context,
-                )
+                await asyncio.wait_for(wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        # Everything due now, grouped per chat so deletes go out in bulk.
+        due: dict[int, list[tuple[int, int, Optional[int]]]] = {}
+        now = time.monotonic()
+        while heap and heap[0][0] <= now:
+            _, _, chat_id, message_id, seconds, warning_message_id = heapq.heappop(heap)
+            due.setdefault(chat_id, []).append((message_id, seconds, warning_message_id))
+
+        for chat_id, items in due.items():
+            try:
+                await _delete_messages_bulk(app.bot, chat_id, [mid for mid, _, _ in items])
             except Exception:
                 pass
+            for _, seconds, warning_message_id in items:
+                if not warning_message_id:
+                    continue
+                try:
+                    deleted_text = (
+                        f"🗑️ [b]Message Deleted[/b]\n\n"
+                        f"Your message has been automatically deleted after {_format_duration(seconds)}."
+                    )
+                    await _edit_emoji_text(
+                        chat_id=chat_id,
+                        message_id=warning_message_id,
+                        text=deleted_text,
+                        context=context,
+                    )
+                except Exception:
+                    pass
+
 
-    context.application.create_task(_job())
+_DURATION_UNIT_SECONDS = {"": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+_DURATION_RE = re.compile(r"([0-9]+)([mhd]?)")
+_DURATION_OFF = frozenset(("off", "0", "disable", "disabled", "none"))
+# Replies that clear an optional setting (start image, UI emoji override).
+_CLEAR_SETTING_WORDS = frozenset(("off", "remove", "none", "disable", "disabled"))
 
 
 def _parse_duration_seconds(s: str) -> Optional[int]:
     s = (s or "").strip().lower()
-    if not s:
-        return None
-    if s in ("off", "0", "disable", "disabled", "none"):
+    if s in _DURATION_OFF:
         return 0
-    mult = 1
-    if s.endswith("m"):
-        mult = 60
-        s = s[:-1]
-    elif s.endswith("h"):
-        mult = 60 * 60
-        s = s[:-1]
-    elif s.endswith("d"):
-        mult = 24 * 60 * 60
-        s = s[:-1]
-    if not s.isdigit():
+    m = _DURATION_RE.fullmatch(s)
+    if not m:
         return None
-    return int(s) * mult
+    return int(m.group(1)) * _DURATION_UNIT_SECONDS[m.group(2)]
+
+
+# Positive "bot is admin in chat" answers, keyed by (bot username, chat id).
+# Negative answers are not cached so a fresh promotion is picked up at once.
+_BOT_ADMIN_CACHE: dict[tuple[str, int], float] = {}
+BOT_ADMIN_CACHE_TTL = 120  # 2 minutes
+
 
 async def _bot_is_admin(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    key = (context.application.bot_data.get("bot_username", ""), int(chat_id))
+    cached_at = _BOT_ADMIN_CACHE.get(key)
+    if cached_at is not None and time.time() - cached_at < BOT_ADMIN_CACHE_TTL:
+        return True
     try:
-        me = await context.bot.get_me()
-        member = await context.bot.get_chat_member(chat_id=chat_id, user_id=me.id)
-        return member.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+        # Bot.id comes from the getMe done once in Application.initialize().
+        member = await context.bot.get_chat_member(chat_id=chat_id, user_id=context.bot.id)
+        is_admin = member.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
     except Exception:
-        return False
+        is_admin = False
+    if is_admin:
+        _BOT_ADMIN_CACHE[key] = time.time()
+    else:
+        _BOT_ADMIN_CACHE.pop(key, None)
+    return is_admin
+
+
+# t.me/c/<internal_id>/<msg_id> or t.me/<username>/<msg_id>; anything after a
+# further "/" or "?" is ignored.
+# Bot API chat id of a channel/supergroup is -(10**12 + internal id): the "-100" prefix.
+_CHANNEL_CHAT_ID_BASE = 10**12
+_TME_POST_RE = re.compile(r"t\.me/+(?:c/([0-9]+)/([0-9]+)|([^/?\s]+)/([0-9]+))(?=[/?]|$)")
 
 
 def _parse_tme_post_link(raw: str) -> Optional[dict[str, Any]]:
@@ -1396,46 +1639,40 @@ def _parse_tme_post_link(raw: str) -> Optional[dict[str, Any]]:
       - https://t.me/c/<internal_id>/<msg_id>  (private channels/groups)
     Returns: {"chat": <username|chat_id:int>, "msg_id": int}
     """
-    s = (raw or "").strip()
-    if "t.me/" not in s:
-        return None
-    # normalize
-    s = s.replace("http://", "https://")
-    try:
-        after = s.split("t.me/", 1)[1]
-    except Exception:
-        return None
-    after = after.split("?", 1)[0].strip("/")
-    parts = after.split("/")
-    if len(parts) < 2:
+    m = _TME_POST_RE.search((raw or "").strip())
+    if not m:
         return None
-
-    if parts[0] == "c" and len(parts) >= 3:
+    internal_id, c_mid, username, mid = m.groups()
+    if internal_id:
         # /c/<internal_id>/<msg_id>
-        internal_id = parts[1]
-        mid = parts[2]
-        if not internal_id.isdigit() or not mid.isdigit():
-            return None
-        chat_id = int(f"-100{internal_id}")
-        return {"chat": chat_id, "msg_id": int(mid)}
-
+        return {"chat": -(_CHANNEL_CHAT_ID_BASE + int(internal_id)), "msg_id": int(c_mid)}
     # /<username>/<msg_id>
-    username = parts[0]
-    mid = parts[1]
-    if not mid.isdigit():
-        return None
     return {"chat": username, "msg_id": int(mid)}
 
 
+# Public @username -> chat id, shared by all bots (usernames are case-insensitive).
+_CHAT_ID_CACHE: dict[str, tuple[int, float]] = {}
+CHAT_ID_CACHE_TTL = 3600  # 1 hour
+CHAT_ID_CACHE_MAX = 1024
+
+
 async def _resolve_chat_id(chat_ref: Any, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
     if isinstance(chat_ref, int):
         return chat_ref
     if isinstance(chat_ref, str) and chat_ref:
+        key = chat_ref.lower()
+        now_ts = time.time()
+        cached = _CHAT_ID_CACHE.get(key)
+        if cached and now_ts - cached[1] < CHAT_ID_CACHE_TTL:
+            return cached[0]
         try:
             chat = await context.bot.get_chat(chat_ref)
-            return int(chat.id)
         except Exception:
             return None
+        if len(_CHAT_ID_CACHE) >= CHAT_ID_CACHE_MAX:
+            _CHAT_ID_CACHE.clear()
+        _CHAT_ID_CACHE[key] = (int(chat.id), now_ts)
+        return int(chat.id)
     return None
 
 
@@ -1444,8 +1681,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     args = context.args or []
     if not update.effective_user or not update.effective_chat:
         return
-    # Preferred source: PTB-parsed args.
-    code = " ".join(args).strip() if args else ""
+    # Preferred source: PTB-parsed args. They come from str.split(), so a lone
+    # deep-link payload (the usual case) needs no join or strip.
+    code = args[0] if len(args) == 1 else " ".join(args)
     # Fallback: parse from raw command text for edge clients/copy-paste cases.
     if not code and update.effective_message and update.effective_message.text:
         t = update.effective_message.text.strip()
@@ -1468,8 +1706,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             return
 
         img_url = await db.get_setting(SETTINGS_START_IMG_URL)
-        raw_text = _welcome_text()
-        formatted_text = await _format_custom_emojis_html(raw_text, context)
+        formatted_text = await _format_custom_emojis_html(WELCOME_TEXT, context)
 
         if img_url:
             try:
@@ -1514,7 +1751,7 @@ async def _consume_premium_quota(
     quota = await db.consume_premium_link(user_id)
     if quota["allowed"]:
         return True
-    reset_ist = datetime.datetime.utcfromtimestamp(int(quota["reset_at"]) + 19800).strftime("%Y-%m-%d %H:%M IST")
+    reset_ist = time.strftime("%Y-%m-%d %H:%M IST", time.gmtime(int(quota["reset_at"]) + 19800))
     await _send_emoji_text(
         chat_id,
         "[b]Daily Direct Link Limit Reached[/b]\n\n"
@@ -1526,6 +1763,52 @@ async def _consume_premium_quota(
     return False
 
 
+async def _copy_channel_range(
+    chat_id: int,
+    from_chat_id: int,
+    start_id: int,
+    end_id: int,
+    context: ContextTypes.DEFAULT_TYPE,
+    autodelete_seconds: Optional[int] = None,
+) -> None:
+    # copy_messages sends up to 100 posts per request, keeps their order and
+    # skips missing/deleted posts itself; fall back to one-by-one copies if a
+    # bulk call fails.
+    for chunk_start in range(start_id, end_id + 1, COPY_MESSAGES_CHUNK):
+        ids = list(range(chunk_start, min(chunk_start + COPY_MESSAGES_CHUNK, end_id + 1)))
+        copied: Optional[tuple[Any, ...]] = None
+        try:
+            copied = await context.bot.copy_messages(chat_id=chat_id, from_chat_id=from_chat_id, message_ids=ids)
+        except RetryAfter as e:
+            await asyncio.sleep(float(getattr(e, "retry_after", 1.0)))
+            try:
+                copied = await context.bot.copy_messages(chat_id=chat_id, from_chat_id=from_chat_id, message_ids=ids)
+            except Exception:
+                copied = None
+        except Exception:
+            copied = None
+
+        if copied is not None:
+            for m in copied:
+                await _maybe_schedule_autodelete(chat_id, m.message_id, context, send_warning=False, seconds=autodelete_seconds)
+            continue
+
+        for mid in ids:
+            try:
+                m = await context.bot.copy_message(chat_id=chat_id, from_chat_id=from_chat_id, message_id=mid)
+                await _maybe_schedule_autodelete(chat_id, m.message_id, context, send_warning=False, seconds=autodelete_seconds)
+            except RetryAfter as e:
+                await asyncio.sleep(float(getattr(e, "retry_after", 1.0)))
+                try:
+                    m = await context.bot.copy_message(chat_id=chat_id, from_chat_id=from_chat_id, message_id=mid)
+                    await _maybe_schedule_autodelete(chat_id, m.message_id, context, send_warning=False, seconds=autodelete_seconds)
+                except Exception:
+                    pass
+            except Exception:
+                # Skip missing/deleted/inaccessible posts silently to keep batches usable.
+                pass
+
+
 async def _deliver_by_code(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str) -> None:
     db: Database = context.application.bot_data["db"]
     user = update.effective_user
@@ -1582,26 +1865,19 @@ async def _deliver_by_code(update: Update, context: ContextTypes.DEFAULT_TYPE, c
         return
 
     if link["target_type"] == "batch":
-        file_ids = await db.get_batch_file_ids(link["target_id"])
-        if not file_ids:
+        file_rows = await db.get_batch_files(link["target_id"])
+        if not file_rows:
             await _send_emoji_text(chat.id, "❌ Batch is empty.", context=context)
             return
-        if len(file_ids) > 100:
+        if len(file_rows) > 100:
             await _send_emoji_text(chat.id, "⚠️ Batch too large to deliver.", context=context)
             return
         if not await _consume_premium_quota(link, user.id, chat.id, context, db, code):
             return
-        for fid in file_ids:
-            file_row = await db.get_file(fid)
-            if file_row:
-                await _send_file(chat.id, file_row, caption, context, send_warning=False)
-        
+        sec = await _get_autodelete_seconds(db)
+        await _send_files_grouped(chat.id, file_rows, caption, context, sec)
+
         # Send a single auto-delete warning for the batch
-        raw_auto = await db.get_setting(SETTINGS_AUTODELETE_SECONDS)
-        try:
-            sec = int(raw_auto) if raw_auto is not None else 0
-        except ValueError:
-            sec = 0
         if sec > 0:
             warning_text = (
                 f"⏳ [b]Auto-Delete Warning[/b]\n\n"
@@ -1666,27 +1942,10 @@ async def _deliver_by_code(update: Update, context: ContextTypes.DEFAULT_TYPE, c
             return
         if not await _consume_premium_quota(link, user.id, chat.id, context, db, code):
             return
-        for mid in range(start_id, end_id + 1):
-            try:
-                m = await context.bot.copy_message(chat_id=chat.id, from_chat_id=chb["channel_id"], message_id=mid)
-                await _maybe_schedule_autodelete(chat.id, m.message_id, context, send_warning=False)
-            except RetryAfter as e:
-                await asyncio.sleep(float(getattr(e, "retry_after", 1.0)))
-                try:
-                    m = await context.bot.copy_message(chat_id=chat.id, from_chat_id=chb["channel_id"], message_id=mid)
-                    await _maybe_schedule_autodelete(chat.id, m.message_id, context, send_warning=False)
-                except Exception:
-                    pass
-            except Exception:
-                # Skip missing/deleted/inaccessible posts silently to keep batches usable.
-                pass
+        sec = await _get_autodelete_seconds(db)
+        await _copy_channel_range(chat.id, chb["channel_id"], start_id, end_id, context, autodelete_seconds=sec)
 
         # Send a single auto-delete warning for the batch
-        raw_auto = await db.get_setting(SETTINGS_AUTODELETE_SECONDS)
-        try:
-            sec = int(raw_auto) if raw_auto is not None else 0
-        except ValueError:
-            sec = 0
         if sec > 0:
             warning_text = (
                 f"⏳ [b]Auto-Delete Warning[/b]\n\n"
@@ -1717,38 +1976,26 @@ async def _deliver_by_code(update: Update, context: ContextTypes.DEFAULT_TYPE, c
     await _send_emoji_text(chat.id, "❌ Unsupported link type.", context=context)
 
 
+def _media_dict(file_type: str, f: Any, file_name: Optional[str]) -> dict[str, str]:
+    return {"file_type": file_type, "file_id": f.file_id, "unique_id": f.file_unique_id, "file_name": file_name}
+
+
 def _extract_media_file_from_msg(m) -> Optional[dict[str, str]]:
     if not m:
         return None
-    if m.document:
-        return {
-            "file_type": "document",
-            "file_id": m.document.file_id,
-            "unique_id": m.document.file_unique_id,
-            "file_name": m.document.file_name,
-        }
-    if m.video:
-        return {
-            "file_type": "video",
-            "file_id": m.video.file_id,
-            "unique_id": m.video.file_unique_id,
-            "file_name": m.video.file_name,
-        }
-    if m.audio:
-        return {
-            "file_type": "audio",
-            "file_id": m.audio.file_id,
-            "unique_id": m.audio.file_unique_id,
-            "file_name": m.audio.file_name,
-        }
-    if m.photo:
-        p = m.photo[-1]
-        return {
-            "file_type": "photo",
-            "file_id": p.file_id,
-            "unique_id": p.file_unique_id,
-            "file_name": None,
-        }
+    # Each media attribute is read once into a local.
+    f = m.document
+    if f:
+        return _media_dict("document", f, f.file_name)
+    f = m.video
+    if f:
+        return _media_dict("video", f, f.file_name)
+    f = m.audio
+    if f:
+        return _media_dict("audio", f, f.file_name)
+    photo = m.photo
+    if photo:
+        return _media_dict("photo", photo[-1], None)
     return None
 
 
@@ -1824,8 +2071,12 @@ async def admin_media_ingest(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     normal_code = new_code()
     prem_code = new_code()
-    await db.create_link(normal_code, "file", file_db_id, "normal", update.effective_user.id)
-    await db.create_link(prem_code, "file", file_db_id, "premium", update.effective_user.id)
+    await db.create_links_bulk(
+        [
+            (normal_code, "file", file_db_id, "normal", update.effective_user.id),
+            (prem_code, "file", file_db_id, "premium", update.effective_user.id),
+        ]
+    )
     normal_url = _deep_link(context, normal_code)
     premium_url = _deep_link(context, prem_code)
 
@@ -1852,8 +2103,7 @@ async def getlink(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     if update.effective_message and update.effective_message.reply_to_message:
         rmsg = update.effective_message.reply_to_message
-        tmp = Update(update.update_id, message=rmsg)
-        media = _extract_media_file(tmp)
+        media = _extract_media_file_from_msg(rmsg)
         if media and update.effective_user:
             target_file_id = await db.save_file(
                 tg_file_id=media["file_id"],
@@ -1892,11 +2142,19 @@ async def getlink(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if not await db.get_file(target_file_id):
             await _send_emoji_text(update.effective_chat.id, "❌ File not found.", context=context)
             return
-        await db.create_link(normal_code, "file", target_file_id, "normal", update.effective_user.id)
-        await db.create_link(prem_code, "file", target_file_id, "premium", update.effective_user.id)
+        await db.create_links_bulk(
+            [
+                (normal_code, "file", target_file_id, "normal", update.effective_user.id),
+                (prem_code, "file", target_file_id, "premium", update.effective_user.id),
+            ]
+        )
     else:
-        await db.create_link(normal_code, "msg", target_msg_id, "normal", update.effective_user.id)
-        await db.create_link(prem_code, "msg", target_msg_id, "premium", update.effective_user.id)
+        await db.create_links_bulk(
+            [
+                (normal_code, "msg", target_msg_id, "normal", update.effective_user.id),
+                (prem_code, "msg", target_msg_id, "premium", update.effective_user.id),
+            ]
+        )
     normal_url = _deep_link(context, normal_code)
     premium_url = _deep_link(context, prem_code)
 
@@ -1938,12 +2196,8 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     cb_effective = cb_st or (legacy_cb if isinstance(legacy_cb, dict) else None)
     if cb_effective:
         src_chat_id = cb_effective.get("chat_id") or cb_effective.get("source_chat_id")
-        for mid in cb_effective.get("source_message_ids") or []:
-            if src_chat_id:
-                try:
-                    await context.bot.delete_message(chat_id=int(src_chat_id), message_id=int(mid))
-                except Exception:
-                    pass
+        if src_chat_id:
+            await _delete_messages_bulk(context.bot, int(src_chat_id), [int(mid) for mid in cb_effective.get("source_message_ids") or []])
         pmid = cb_effective.get("prompt_message_id")
         if pmid and src_chat_id:
             try:
@@ -1965,6 +2219,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if open_req and str(open_req.get("status") or "") in ("pending", "submitted"):
         try:
             await db.expire_payment_request_if_pending(int(open_req["id"]))
+            _drop_pay_admin_msg_refs(int(open_req["id"]))
             await _update_payment_user_status(
                 open_req,
                 context,
@@ -2129,8 +2384,12 @@ async def batch_link_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     normal_code = new_code()
     prem_code = new_code()
-    await db.create_link(normal_code, "chbatch", chbatch_id, "normal", update.effective_user.id)
-    await db.create_link(prem_code, "chbatch", chbatch_id, "premium", update.effective_user.id)
+    await db.create_links_bulk(
+        [
+            (normal_code, "chbatch", chbatch_id, "normal", update.effective_user.id),
+            (prem_code, "chbatch", chbatch_id, "premium", update.effective_user.id),
+        ]
+    )
 
     context.user_data.pop("chbatch_state", None)
     await _batch_ui_edit(
@@ -2227,6 +2486,8 @@ async def custombatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     )
 
 
+# Re-sent after every file in a session; markups are immutable, so reuse them.
+@functools.lru_cache(maxsize=64)
 def _custombatch_prompt_keyboard(session_id: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         [
@@ -2270,12 +2531,8 @@ async def custombatch_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         st = sessions.pop(sid, None) or context.user_data.pop("custombatch_state", None) or {}
         context.user_data.pop("custombatch_session_id", None)
         src_chat_id = st.get("chat_id") or st.get("source_chat_id")
-        for mid in st.get("source_message_ids") or []:
-            if src_chat_id:
-                try:
-                    await context.bot.delete_message(chat_id=int(src_chat_id), message_id=int(mid))
-                except Exception:
-                    pass
+        if src_chat_id:
+            await _delete_messages_bulk(context.bot, int(src_chat_id), [int(mid) for mid in st.get("source_message_ids") or []])
         try:
             await q.delete_message()
         except Exception:
@@ -2296,18 +2553,18 @@ async def custombatch_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
         normal_code = new_code()
         prem_code = new_code()
-        await db.create_link(normal_code, "batch", batch_id, "normal", update.effective_user.id)
-        await db.create_link(prem_code, "batch", batch_id, "premium", update.effective_user.id)
+        await db.create_links_bulk(
+            [
+                (normal_code, "batch", batch_id, "normal", update.effective_user.id),
+                (prem_code, "batch", batch_id, "premium", update.effective_user.id),
+            ]
+        )
 
         st = sessions.pop(sid, None) or context.user_data.pop("custombatch_state", None) or {}
         context.user_data.pop("custombatch_session_id", None)
         src_chat_id = st.get("chat_id") or st.get("source_chat_id")
-        for mid in st.get("source_message_ids") or []:
-            if src_chat_id:
-                try:
-                    await context.bot.delete_message(chat_id=int(src_chat_id), message_id=int(mid))
-                except Exception:
-                    pass
+        if src_chat_id:
+            await _delete_messages_bulk(context.bot, int(src_chat_id), [int(mid) for mid in st.get("source_message_ids") or []])
 
         await _edit_emoji_text(
             update.effective_chat.id,
@@ -2380,7 +2637,7 @@ async def addpremium(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     db: Database = context.application.bot_data["db"]
     grant_days = max(1, days)
     until = await db.add_premium_seconds(uid, grant_days * DAY_SECONDS)
-    expiry_utc = datetime.datetime.utcfromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S UTC")
+    expiry_utc = _fmt_utc(until)
 
     user_notified = False
     try:
@@ -2478,11 +2735,15 @@ async def extendlast24h(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             continue
 
         users_extended += 1
-        for r in user_reqs:
-            await db.set_setting(f"{SETTINGS_EXTEND_24H_PREFIX}{int(r['id'])}", str(now_ts))
-            requests_marked += 1
+        # The extension is already applied; a failed marker write must not count
+        # the user as failed. All of this user's request markers go in one write.
+        try:
+            await db.set_settings_many({f"{SETTINGS_EXTEND_24H_PREFIX}{int(r['id'])}": str(now_ts) for r in user_reqs})
+            requests_marked += len(user_reqs)
+        except Exception as e:
+            logger.warning("extendlast24h: failed to mark requests for user %s: %s", uid, e)
 
-        expiry_utc = datetime.datetime.utcfromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S UTC")
+        expiry_utc = _fmt_utc(until)
         try:
             await _send_emoji_text(
                 uid,
@@ -2711,12 +2972,8 @@ async def _generate_tokens_and_send(
     db: Database,
     context: ContextTypes.DEFAULT_TYPE,
 ) -> None:
-    tokens: list[str] = []
-    grant_seconds = days * DAY_SECONDS
-    for _ in range(count):
-        t = new_token()
-        await db.create_token(t, generated_by, grant_seconds)
-        tokens.append(t)
+    tokens = [new_token() for _ in range(count)]
+    await db.create_tokens_bulk(tokens, generated_by, days * DAY_SECONDS)
 
     days_label = f"{days} day" if days == 1 else f"{days} days"
 
@@ -2757,7 +3014,7 @@ async def redeem(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
     until = await db.add_premium_seconds(update.effective_user.id, grant)
 
-    expiry_utc = datetime.datetime.utcfromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S UTC")
+    expiry_utc = _fmt_utc(until)
 
     success_text = (
         "✅ [b]Token Redeemed Successfully![/b] 🎉\n\n"
@@ -2774,6 +3031,18 @@ async def redeem(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
 
 
+PLAN_TEXT = (
+    "💎 [b]Premium Plans[/b]\n\n"
+    "[q]• [b]7 links/day[/b]: 1 Day ₹10 | 7 Days ₹35 | 1 Month ₹115\n"
+    "• [b]20 links/day[/b]: 1 Day ₹15 | 7 Days ₹50 | 1 Month ₹169[/q]\n\n"
+    "🔓 [b]Normal User Benefit[/b]\n"
+    "• You must watch ads to access final links\n\n"
+    "⭐ [b]Premium User Benefit[/b]\n"
+    "• Direct access (no ads)\n\n"
+    "🛒 [b]Buy Premium[/b]: /pay"
+)
+
+
 async def plan(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await _upsert_user(update, context)
     if not update.effective_user or not update.effective_chat:
@@ -2784,33 +3053,21 @@ async def plan(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     now = int(time.time())
     active = premium_until >= now
     if active:
-        dt = datetime.datetime.utcfromtimestamp(premium_until).strftime("%Y-%m-%d %H:%M:%S UTC")
+        dt = _fmt_utc(premium_until)
         status = f"✅ [b]Active[/b]\n⏳ Expires: [c]{dt}[/c]"
     else:
         status = "❌ [b]Not Active[/b]"
 
+    # Plans and the caller's status go out as one message (one API call).
     await _send_emoji_text(
         update.effective_chat.id,
-        "💎 [b]Premium Plans[/b]\n\n"
-        "[q]• [b]7 links/day[/b]: 1 Day ₹10 | 7 Days ₹35 | 1 Month ₹115\n"
-        "• [b]20 links/day[/b]: 1 Day ₹15 | 7 Days ₹50 | 1 Month ₹169[/q]\n\n"
-        "🔓 [b]Normal User Benefit[/b]\n"
-        "• You must watch ads to access final links\n\n"
-        "⭐ [b]Premium User Benefit[/b]\n"
-        "• Direct access (no ads)\n\n"
-        "🛒 [b]Buy Premium[/b]: /pay",
-        context,
-    )
-
-    await _send_emoji_text(
-        update.effective_chat.id,
-        f"👤 [b]Your Premium Status[/b]\n\n[q]{status}[/q]",
+        f"{PLAN_TEXT}\n\n👤 [b]Your Premium Status[/b]\n\n[q]{status}[/q]",
         context,
     )
 
 
-def _pay_plan_keyboard(gateway: str = "manual", context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> InlineKeyboardMarkup:
-    buttons = []
+def _build_pay_plan_rows() -> tuple[tuple[InlineKeyboardButton, ...], ...]:
+    rows: list[tuple[InlineKeyboardButton, ...]] = []
     for key, plan in PAY_PLANS.items():
         limit = plan["daily_limit"]
         if limit == 999999:
@@ -2832,25 +3089,36 @@ def _pay_plan_keyboard(gateway: str = "manual", context: Optional[ContextTypes.D
 
         # Label row (informational and non-clickable)
         label_text = f"🔹 {limit_prefix} ({duration}) 🔹"
-        buttons.append([InlineKeyboardButton(label_text, callback_data="paynoop")])
-        
+        rows.append((InlineKeyboardButton(label_text, callback_data="paynoop"),))
+
         # Payment options row (UPI vs Telegram Stars)
         stars_price = plan.get("stars", plan["amount"])
         pay_upi_btn = InlineKeyboardButton(f"💳 ᴜᴘɪ (₹{plan['amount']})", callback_data=f"payplan:upi:{key}")
         pay_stars_btn = InlineKeyboardButton(f"⭐ ꜱᴛᴀʀꜱ ({stars_price})", callback_data=f"payplan:stars:{key}")
-        buttons.append([pay_upi_btn, pay_stars_btn])
-        
-    donation_url = None
-    if context and context.application:
-        donation_url = context.application.bot_data.get("donation_invoice_link")
+        rows.append((pay_upi_btn, pay_stars_btn))
+    return tuple(rows)
+
+
+# PAY_PLANS is fixed, so the plan rows are built once at import.
+_PAY_PLAN_ROWS = _build_pay_plan_rows()
+
 
+@functools.lru_cache(maxsize=64)
+def _pay_plan_markup(donation_url: Optional[str]) -> InlineKeyboardMarkup:
+    # Only the donate button differs per bot (cached invoice link or fallback).
     if donation_url:
-        buttons.append([InlineKeyboardButton("💟 ᴅᴏɴᴀᴛᴇ 1 ꜱᴛᴀʀ (ᴛᴇꜱᴛ ꜰʟᴏᴡ)", url=donation_url)])
+        donate_btn = InlineKeyboardButton("💟 ᴅᴏɴᴀᴛᴇ 1 ꜱᴛᴀʀ (ᴛᴇꜱᴛ ꜰʟᴏᴡ)", url=donation_url)
     else:
-        buttons.append([InlineKeyboardButton("💟 ᴅᴏɴᴀᴛᴇ 1 ꜱᴛᴀʀ (ᴛᴇꜱᴛ ꜰʟᴏᴡ)", callback_data="paydonation:1")])
-    return InlineKeyboardMarkup(buttons)
+        donate_btn = InlineKeyboardButton("💟 ᴅᴏɴᴀᴛᴇ 1 ꜱᴛᴀʀ (ᴛᴇꜱᴛ ꜰʟᴏᴡ)", callback_data="paydonation:1")
+    return InlineKeyboardMarkup((*_PAY_PLAN_ROWS, (donate_btn,)))
 
 
+def _pay_plan_keyboard(gateway: str = "manual", context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> InlineKeyboardMarkup:
+    donation_url = None
+    if context and context.application:
+        donation_url = context.application.bot_data.get("donation_invoice_link")
+    return _pay_plan_markup(donation_url)
+
 
 def _upi_uri(upi_id: str, amount_rs: int, payee_name: str, note: str) -> str:
     pa = quote(upi_id, safe="")
@@ -2864,8 +3132,23 @@ def _upi_qr_image_url(upi_uri: str) -> str:
     return f"https://api.qrserver.com/v1/create-qr-code/?size=700x700&data={quote(upi_uri, safe='')}"
 
 
+def _upi_qr_photo(upi_uri: str) -> bytes | str:
+    # Encode the QR in-process when segno is available (~700px PNG, like the
+    # remote endpoint) so Telegram doesn't have to fetch a third-party URL.
+    if segno is None:
+        return _upi_qr_image_url(upi_uri)
+    buf = io.BytesIO()
+    segno.make(upi_uri, error="m").save(buf, kind="png", scale=12, border=4)
+    return buf.getvalue()
+
+
+def _fmt_utc(ts: int) -> str:
+    # time.gmtime skips building a datetime (and the deprecated utcfromtimestamp).
+    return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(ts))
+
+
 def _format_utc(ts: int) -> str:
-    return datetime.datetime.utcfromtimestamp(int(ts)).strftime("%Y-%m-%d %H:%M:%S UTC") if int(ts) > 0 else "-"
+    return _fmt_utc(int(ts)) if int(ts) > 0 else "-"
 
 
 def _payment_plan_label(plan_key: str, plan_days: int) -> str:
@@ -2883,7 +3166,7 @@ async def _activate_payment_plan(db: Database, req: dict[str, Any]) -> int:
 
 
 def _manual_payment_note(user_id: int, request_id: int, plan_days: int, projected_until: int) -> str:
-    expiry_tag = datetime.datetime.utcfromtimestamp(int(projected_until)).strftime("%Y%m%d") if int(projected_until) > 0 else "NA"
+    expiry_tag = time.strftime("%Y%m%d", time.gmtime(int(projected_until))) if int(projected_until) > 0 else "NA"
     return f"AFSP UID{int(user_id)} ORD{int(request_id)} P{int(plan_days)}D EXP{expiry_tag}"
 
 
@@ -3066,24 +3349,12 @@ async def _cleanup_payment_user_ui(req: dict[str, Any], context: ContextTypes.DE
     await db.clear_payment_ui_messages(int(req["id"]))
 
 
-async def _payment_timeout_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    data = context.job.data or {}
-    rid = data.get("request_id")
-    if not rid:
-        return
-    db: Database = context.application.bot_data["db"]
-    req = await db.get_payment_request(int(rid))
-    if not req:
-        return
+async def _expire_payment_request(req: dict[str, Any], context: ContextTypes.DEFAULT_TYPE) -> None:
     # Expire only if no UTR submitted within timeout window.
-    if req["status"] != "pending":
-        return
-    now = int(time.time())
-    if int(req.get("expires_at") or 0) > now:
-        return
-    changed = await db.expire_payment_request_if_pending(int(rid))
+    changed = await context.application.bot_data["db"].expire_payment_request_if_pending(int(req["id"]))
     if not changed:
         return
+    _drop_pay_admin_msg_refs(int(req["id"]))
     await _show_payment_timeout_ui(req, context)
     try:
         await _send_emoji_text(
@@ -3097,6 +3368,21 @@ async def _payment_timeout_job(context: ContextTypes.DEFAULT_TYPE) -> None:
         pass
 
 
+async def _payment_expiry_sweep_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    # One repeating job expires every overdue manual order in a single query,
+    # instead of a run_once job per /pay.
+    db = context.application.bot_data.get("db")
+    if not db:
+        return
+    try:
+        reqs = await db.list_expired_pending_payment_requests()
+    except Exception as e:
+        logger.warning("Payment expiry sweep failed: %s", e)
+        return
+    if reqs:
+        await asyncio.gather(*(_expire_payment_request(req, context) for req in reqs), return_exceptions=True)
+
+
 async def _handle_manual_payment(update: Update, context: ContextTypes.DEFAULT_TYPE, q: Any, rid: int, plan: dict) -> None:
     db: Database = context.application.bot_data["db"]
     upi_id = await db.get_setting(SETTINGS_PAY_UPI)
@@ -3112,7 +3398,7 @@ async def _handle_manual_payment(update: Update, context: ContextTypes.DEFAULT_T
 
     note = f"premium {plan['label']} order#{rid}"
     upi_uri = _upi_uri(upi_id=upi_id, amount_rs=int(plan["amount"]), payee_name=pay_name, note=note)
-    qr_url = _upi_qr_image_url(upi_uri)
+    qr_photo = _upi_qr_photo(upi_uri)
     plan_label = html.escape(str(plan["label"]))
     upi_html = html.escape(upi_id)
     caption = (
@@ -3142,7 +3428,7 @@ async def _handle_manual_payment(update: Update, context: ContextTypes.DEFAULT_T
     payment_msg_id: Optional[int] = None
     try:
         payment_msg = await update.effective_chat.send_photo(
-            photo=qr_url,
+            photo=qr_photo,
             caption=caption,
             parse_mode="HTML",
             reply_markup=kb,
@@ -3162,13 +3448,6 @@ async def _handle_manual_payment(update: Update, context: ContextTypes.DEFAULT_T
         int(payment_msg_id) if payment_msg_id is not None else int(q.message.message_id),
         None,
     )
-    if context.application.job_queue:
-        context.application.job_queue.run_once(
-            _payment_timeout_job,
-            when=300,
-            data={"request_id": int(rid)},
-            name=f"pay-timeout-{rid}",
-        )
 
 
 async def _handle_manual_payment_recovery(
@@ -3179,11 +3458,12 @@ async def _handle_manual_payment_recovery(
     plan: dict,
 ) -> None:
     db: Database = context.application.bot_data["db"]
+    chat = update.effective_chat
     upi_id = await db.get_setting(SETTINGS_PAY_UPI)
     pay_name = await db.get_setting(SETTINGS_PAY_NAME) or "Premium Store"
     if not upi_id:
         await _edit_emoji_text(
-            update.effective_chat.id,
+            chat.id,
             q.message.message_id,
             "Payment is not configured by admin yet.\nPlease contact admin.",
             context,
@@ -3191,14 +3471,17 @@ async def _handle_manual_payment_recovery(
         return
 
     req = await db.get_payment_request(int(rid))
-    if not req or not update.effective_user or not update.effective_chat:
-        await _send_emoji_text(update.effective_chat.id, "Payment request expired/invalid. Please run /pay again.", context)
+    if not req or not update.effective_user or not chat:
+        await _send_emoji_text(chat.id, "Payment request expired/invalid. Please run /pay again.", context)
         return
 
+    chat_id = int(chat.id)
+    uid = int(update.effective_user.id)
+    amount = int(plan["amount"])
     projected_until = int(req.get("projected_premium_until") or 0)
-    note = _manual_payment_note(update.effective_user.id, rid, int(plan["days"]), projected_until)
-    upi_uri = _upi_uri(upi_id=upi_id, amount_rs=int(plan["amount"]), payee_name=pay_name, note=note)
-    qr_url = _upi_qr_image_url(upi_uri)
+    note = _manual_payment_note(uid, rid, int(plan["days"]), projected_until)
+    upi_uri = _upi_uri(upi_id=upi_id, amount_rs=amount, payee_name=pay_name, note=note)
+    qr_photo = _upi_qr_photo(upi_uri)
     plan_label = html.escape(str(plan["label"]))
     upi_html = html.escape(upi_id)
     projected_expiry_utc = html.escape(_format_utc(projected_until))
@@ -3206,9 +3489,9 @@ async def _handle_manual_payment_recovery(
     caption = (
         "⚡ <b>PREMIUM PAYMENT</b> ⚡\n\n"
         f"💎 <b>Plan:</b> {plan_label}\n"
-        f"💰 <b>Amount:</b> ₹{int(plan['amount'])}\n"
+        f"💰 <b>Amount:</b> ₹{amount}\n"
         f"🆔 <b>Order ID:</b> <code>#{rid}</code>\n"
-        f"👤 <b>User ID:</b> <code>{int(update.effective_user.id)}</code>\n"
+        f"👤 <b>User ID:</b> <code>{uid}</code>\n"
         f"📅 <b>Projected Expiry:</b> <code>{projected_expiry_utc}</code>\n\n"
         "💳 <b>UPI ID</b>\n"
         f"<blockquote>{upi_html}</blockquote>\n"
@@ -3223,9 +3506,9 @@ async def _handle_manual_payment_recovery(
     status_text = (
         "<b>Payment Request Created</b>\n\n"
         f"Order ID: <code>#{rid}</code>\n"
-        f"User ID: <code>{int(update.effective_user.id)}</code>\n"
+        f"User ID: <code>{uid}</code>\n"
         f"Plan: <b>{plan_label}</b>\n"
-        f"Amount: Rs{int(plan['amount'])}\n"
+        f"Amount: Rs{amount}\n"
         f"Projected Expiry: <code>{projected_expiry_utc}</code>\n\n"
         "Status: <b>Pending</b>\n"
         "Complete payment using the QR above.\n"
@@ -3242,21 +3525,21 @@ async def _handle_manual_payment_recovery(
     payment_msg_id: Optional[int] = None
     status_msg_id: Optional[int] = None
     try:
-        payment_msg = await update.effective_chat.send_photo(
-            photo=qr_url,
+        payment_msg = await chat.send_photo(
+            photo=qr_photo,
             caption=caption,
             parse_mode="HTML",
         )
         payment_msg_id = payment_msg.message_id
     except Exception:
         await _send_emoji_text(
-            update.effective_chat.id,
+            chat_id,
             f"QR load failed. Pay via UPI ID shown above.\nUPI URI:\n{upi_uri}",
             context,
         )
     try:
         status_msg = await context.bot.send_message(
-            chat_id=int(update.effective_chat.id),
+            chat_id=chat_id,
             text=status_text,
             parse_mode="HTML",
             reply_markup=kb,
@@ -3268,17 +3551,11 @@ async def _handle_manual_payment_recovery(
 
     await db.set_payment_ui_messages(
         int(rid),
-        int(update.effective_chat.id),
+        chat_id,
         int(status_msg_id) if status_msg_id is not None else int(payment_msg_id) if payment_msg_id is not None else int(q.message.message_id),
         int(payment_msg_id) if payment_msg_id is not None and status_msg_id is not None else None,
     )
-    if context.application.job_queue:
-        context.application.job_queue.run_once(
-            _payment_timeout_job,
-            when=300,
-            data={"request_id": int(rid)},
-            name=f"pay-timeout-{rid}",
-        )
+
 
 async def _get_premium_channels_text(db: Database) -> str:
     """Returns a formatted string of premium channels for approval messages."""
@@ -3335,11 +3612,10 @@ async def _send_premium_direct_access_message(user_id: int, context: ContextType
 async def _notify_autoverify_success(context: ContextTypes.DEFAULT_TYPE, req: dict[str, Any]) -> None:
     db: Database = context.application.bot_data["db"]
     cfg = context.application.bot_data["cfg"]
-    admin_ids = await db.list_admin_ids()
+    uid = int(req["user_id"])
+    admin_ids, user_data = await asyncio.gather(db.list_admin_ids(), db.get_user(uid))
     targets = {int(cfg.owner_id), *[int(x) for x in admin_ids]}
 
-    uid = int(req["user_id"])
-    user_data = await db.get_user(uid)
     first_name = user_data.get("first_name", "Unknown") if user_data else "Unknown"
     username = f"@{user_data.get('username')}" if user_data and user_data.get("username") else "-"
 
@@ -3357,11 +3633,11 @@ async def _notify_autoverify_success(context: ContextTypes.DEFAULT_TYPE, req: di
         "✅ Payment auto-verified and plan activated."
     )
 
-    for aid in targets:
-        try:
-            await _send_emoji_text(aid, note, context)
-        except Exception:
-            pass
+    formatted_note = await _format_ui_text(note, context)
+    await asyncio.gather(
+        *(context.bot.send_message(chat_id=aid, text=formatted_note, parse_mode="HTML") for aid in targets),
+        return_exceptions=True,
+    )
 
 
 async def _poll_and_complete(context: ContextTypes.DEFAULT_TYPE, rid: int, qr_code_id: str) -> None:
@@ -3375,13 +3651,14 @@ async def _poll_and_complete(context: ContextTypes.DEFAULT_TYPE, rid: int, qr_co
 
     if success:
         ok = await db.approve_payment_request(rid, admin_id=0)
+        _drop_pay_admin_msg_refs(rid)
         if not ok:
             return  # Race condition — already handled elsewhere.
         until = await _activate_payment_plan(db, req)
 
         # Notify owner and admins about autoverify success
         await _notify_autoverify_success(context, req)
-        expiry_utc = datetime.datetime.utcfromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S UTC")
+        expiry_utc = _fmt_utc(until)
         # 1. Edit the old payment message to remove the Pay button and show Success status with custom emoji
         await _update_payment_user_status(
             req,
@@ -3420,6 +3697,7 @@ async def _poll_and_complete(context: ContextTypes.DEFAULT_TYPE, rid: int, qr_co
         await db.clear_payment_ui_messages(int(req["id"]))
     else:
         changed = await db.expire_payment_request_if_pending(rid)
+        _drop_pay_admin_msg_refs(rid)
         if changed:
             user_chat_id = req.get("user_chat_id")
             details_msg_id = req.get("details_msg_id")
@@ -3469,12 +3747,13 @@ async def _poll_razorpay_and_complete(context: ContextTypes.DEFAULT_TYPE, rid: i
 
     if success:
         ok = await db.approve_payment_request(rid, admin_id=0)
+        _drop_pay_admin_msg_refs(rid)
         if not ok:
             return
         until = await _activate_payment_plan(db, req)
 
         await _notify_autoverify_success(context, req)
-        expiry_utc = datetime.datetime.utcfromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S UTC")
+        expiry_utc = _fmt_utc(until)
 
         await _cleanup_payment_user_ui(req, context)
 
@@ -3506,6 +3785,7 @@ async def _poll_razorpay_and_complete(context: ContextTypes.DEFAULT_TYPE, rid: i
         await db.clear_payment_ui_messages(int(req["id"]))
     else:
         changed = await db.expire_payment_request_if_pending(rid)
+        _drop_pay_admin_msg_refs(rid)
         if changed:
             await _show_payment_timeout_ui(req, context)
             try:
@@ -3866,13 +4146,14 @@ async def successful_payment_callback(update: Update, context: ContextTypes.DEFA
 
     # Process and approve payment request
     ok = await db.approve_payment_request(rid, admin_id=0)
+    _drop_pay_admin_msg_refs(rid)
     if not ok:
         logger.error("Failed to approve payment request %d in database", rid)
         return
 
     until = await db.add_premium_seconds(int(req["user_id"]), int(req["plan_days"]) * DAY_SECONDS)
     await _notify_autoverify_success(context, req)
-    expiry_utc = datetime.datetime.utcfromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S UTC")
+    expiry_utc = _fmt_utc(until)
 
     await _update_payment_user_status(
         req,
@@ -3910,46 +4191,43 @@ async def successful_payment_callback(update: Update, context: ContextTypes.DEFA
     await db.clear_payment_ui_messages(int(req["id"]))
 
 
+PAY_TEXT = (
+    "⭐ [b]Premium Membership[/b]\n\n"
+    "🔓 [b]Free Users[/b]\n"
+    "• Can access Normal links only\n"
+    "• Premium links will be [b]blocked[/b]\n\n"
+    "💎 [b]Premium Users Get[/b]\n"
+    "• ✅ Premium (VIP) links open instantly\n"
+    "• ✅ No Ads — direct file/content delivery\n"
+    "• ✅ Instant Delivery — zero interruptions\n"
+    "• ✅ All exclusive content unlocked\n\n"
+    "📦 [b]Available Plans[/b]\n"
+    "• [b]7 links/day[/b]: 1 Day (₹10 / 10 Stars ⭐) | 7 Days (₹35 / 35 Stars ⭐) | 1 Month (₹115 / 115 Stars ⭐)\n"
+    "• [b]20 links/day[/b]: 1 Day (₹15 / 15 Stars ⭐) | 7 Days (₹50 / 50 Stars ⭐) | 1 Month (₹169 / 169 Stars ⭐)\n"
+    "• [b]Unlimited links/day[/b]: 1 Month (₹199 / 199 Stars ⭐)\n\n"
+    "👇 Select your plan below:"
+)
+
+
 async def pay(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await _upsert_user(update, context)
     cfg = context.application.bot_data["cfg"]
     db: Database = context.application.bot_data["db"]
     gateway = await _get_payment_gateway(db, cfg)
 
-    plans_text = (
-        "📦 [b]Available Plans[/b]\n"
-        "• [b]7 links/day[/b]: 1 Day (₹10 / 10 Stars ⭐) | 7 Days (₹35 / 35 Stars ⭐) | 1 Month (₹115 / 115 Stars ⭐)\n"
-        "• [b]20 links/day[/b]: 1 Day (₹15 / 15 Stars ⭐) | 7 Days (₹50 / 50 Stars ⭐) | 1 Month (₹169 / 169 Stars ⭐)\n"
-        "• [b]Unlimited links/day[/b]: 1 Month (₹199 / 199 Stars ⭐)\n\n"
-    )
-
-    text_to_send = (
-        "⭐ [b]Premium Membership[/b]\n\n"
-        "🔓 [b]Free Users[/b]\n"
-        "• Can access Normal links only\n"
-        "• Premium links will be [b]blocked[/b]\n\n"
-        "💎 [b]Premium Users Get[/b]\n"
-        "• ✅ Premium (VIP) links open instantly\n"
-        "• ✅ No Ads — direct file/content delivery\n"
-        "• ✅ Instant Delivery — zero interruptions\n"
-        "• ✅ All exclusive content unlocked\n\n" +
-        plans_text +
-        "👇 Select your plan below:"
-    )
-
     q = update.callback_query
     if q and q.message:
         await _edit_emoji_text(
             update.effective_chat.id,
             q.message.message_id,
-            text_to_send,
+            PAY_TEXT,
             context,
             reply_markup=_pay_plan_keyboard(gateway, context),
         )
     else:
         await _send_emoji_text(
             update.effective_chat.id,
-            text_to_send,
+            PAY_TEXT,
             context,
             reply_markup=_pay_plan_keyboard(gateway, context),
         )
@@ -4065,6 +4343,7 @@ async def pay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             # If there's an active pending request, clean it up before creating a new one.
             if existing.get("status") == "pending":
                 changed = await db.expire_payment_request_if_pending(int(existing["id"]))
+                _drop_pay_admin_msg_refs(int(existing["id"]))
                 if changed:
                     await _update_payment_user_status(
                         existing,
@@ -4080,6 +4359,7 @@ async def pay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             elif existing.get("status") == "submitted":
                 # For XWallet/Razorpay/Stars: expire the old submitted one and allow fresh order.
                 await db.expire_payment_request_if_pending(int(existing["id"]))
+                _drop_pay_admin_msg_refs(int(existing["id"]))
                 await _update_payment_user_status(
                     existing,
                     context,
@@ -4121,6 +4401,7 @@ async def pay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             await q.answer("Order already processed or expired.", show_alert=True)
             return
         await db.expire_payment_request_if_pending(rid)
+        _drop_pay_admin_msg_refs(rid)
         await _update_payment_user_status(
             req,
             context,
@@ -4155,6 +4436,7 @@ async def pay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         now = int(time.time())
         if int(req.get("expires_at") or 0) > 0 and int(req.get("expires_at") or 0) <= now:
             changed = await db.expire_payment_request_if_pending(rid)
+            _drop_pay_admin_msg_refs(rid)
             if changed:
                 await _show_payment_timeout_ui(req, context)
             await q.answer("Payment expired. No proof was submitted within 5 minutes.", show_alert=True)
@@ -4197,21 +4479,33 @@ async def _notify_payment_admins(update: Update, context: ContextTypes.DEFAULT_T
             ]
         ]
     )
-    for aid in targets:
+    formatted_note = await _format_ui_text(note, context)
+    msg = update.effective_message
+    # If user sent media, forward copy for proof.
+    proof = bool(msg and (msg.photo or msg.document))
+
+    async def _notify_one(aid: int) -> None:
         try:
-            sent = await _send_emoji_text(aid, note, context, reply_markup=kb)
+            sent = await context.bot.send_message(chat_id=aid, text=formatted_note, parse_mode="HTML", reply_markup=kb)
             if sent and getattr(sent, "message_id", None):
-                await _save_pay_admin_msg_ref(db, int(req["id"]), int(aid), int(sent.message_id))
-            # If user sent media, forward copy for proof.
-            if update.effective_message and (update.effective_message.photo or update.effective_message.document):
+                await _save_pay_admin_msg_ref(db, int(req["id"]), int(aid), int(sent.message_id), persist=False)
+            if proof:
                 await context.bot.copy_message(
                     chat_id=aid,
                     from_chat_id=update.effective_chat.id,
-                    message_id=update.effective_message.message_id,
+                    message_id=msg.message_id,
                 )
         except Exception:
             pass
 
+    # Admins are notified concurrently; each still gets the note before the proof.
+    await asyncio.gather(*(_notify_one(aid) for aid in targets))
+    # Persist all admin refs in one write once the fan-out is done.
+    try:
+        await _persist_pay_admin_msg_refs(db, int(req["id"]))
+    except Exception:
+        pass
+
 
 async def pay_utr_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.effective_user or not update.effective_chat or not update.effective_message:
@@ -4229,6 +4523,7 @@ async def pay_utr_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     now = int(time.time())
     if req["status"] == "pending" and int(req.get("expires_at") or 0) > 0 and int(req.get("expires_at") or 0) <= now:
         await db.expire_payment_request_if_pending(int(rid))
+        _drop_pay_admin_msg_refs(int(rid))
         await _show_payment_timeout_ui(req, context)
         ud.pop("pay_utr_request_id", None)
         await _send_emoji_text(update.effective_chat.id, "⏳ Payment request expired. Please run /pay again.", context)
@@ -4308,18 +4603,21 @@ async def pay_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"Status: {req['status']}\n"
             f"Processed by: {who}"
         )
-        await _sync_pay_admin_status(context, int(req["id"]), status_text)
+        await _sync_pay_admin_status(context, rid, status_text)
         return
 
+    admin = update.effective_user
+    admin_name = f"@{admin.username}" if admin.username else str(admin.id)
+    user_id = int(req["user_id"])
     if action == "approve":
-        ok = await db.approve_payment_request(rid, update.effective_user.id)
+        ok = await db.approve_payment_request(rid, admin.id)
         if not ok:
+            _drop_pay_admin_msg_refs(rid)
             await q.answer("Already handled", show_alert=True)
             return
         until = await _activate_payment_plan(db, req)
-        expiry_utc = datetime.datetime.utcfromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S UTC")
-        reviewed_at = datetime.datetime.utcfromtimestamp(int(time.time())).strftime("%Y-%m-%d %H:%M:%S UTC")
-        admin_name = f"@{update.effective_user.username}" if update.effective_user.username else str(update.effective_user.id)
+        expiry_utc = _fmt_utc(until)
+        reviewed_at = _fmt_utc(int(time.time()))
         # Notify user
         try:
             ch_text = await _get_premium_channels_text(db)
@@ -4329,14 +4627,14 @@ async def pay_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 "\n\n✨ You can now get [b]direct links[/b] from all these channels — [b]completely ad-free![/b]"
             ) if ch_text else ""
             await _send_emoji_text(
-                int(req["user_id"]),
+                user_id,
                 "🎉 [b]Congratulations! Payment Verified![/b]\n\n"
                 f"💎 Plan activated: {req['plan_key']} ({req['plan_days']} days)\n"
                 f"🕒 Expires: {expiry_utc}"
                 + ch_section,
                 context,
             )
-            await _send_premium_direct_access_message(int(req["user_id"]), context)
+            await _send_premium_direct_access_message(user_id, context)
         except Exception:
             pass
         approved_text = (
@@ -4349,7 +4647,7 @@ async def pay_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"Reviewed At: {reviewed_at}\n"
             f"Premium Until: {expiry_utc}"
         )
-        await _sync_pay_admin_status(context, int(req["id"]), approved_text)
+        await _sync_pay_admin_status(context, rid, approved_text)
         await _update_manual_payment_user_final_status(
             req,
             context,
@@ -4360,19 +4658,19 @@ async def pay_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 f"Approved By: <code>{html.escape(admin_name)}</code>",
             ],
         )
-        await db.clear_payment_ui_messages(int(req["id"]))
+        await db.clear_payment_ui_messages(rid)
         return
 
-    ok = await db.reject_payment_request(rid, update.effective_user.id)
+    ok = await db.reject_payment_request(rid, admin.id)
     if not ok:
+        _drop_pay_admin_msg_refs(rid)
         await q.answer("Already handled", show_alert=True)
         return
-    reviewed_at = datetime.datetime.utcfromtimestamp(int(time.time())).strftime("%Y-%m-%d %H:%M:%S UTC")
-    admin_name = f"@{update.effective_user.username}" if update.effective_user.username else str(update.effective_user.id)
+    reviewed_at = _fmt_utc(int(time.time()))
     # Notify user
     try:
         await _send_emoji_text(
-            int(req["user_id"]),
+            user_id,
             "❌ Payment Rejected\n\n"
             "Your submitted payment could not be verified.\n"
             "Please contact admin with proper payment proof.",
@@ -4389,7 +4687,7 @@ async def pay_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         f"By Admin: {admin_name}\n"
         f"Reviewed At: {reviewed_at}"
     )
-    await _sync_pay_admin_status(context, int(req["id"]), rejected_text)
+    await _sync_pay_admin_status(context, rid, rejected_text)
     await _update_manual_payment_user_final_status(
         req,
         context,
@@ -5130,7 +5428,7 @@ async def bsettings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await _edit_emoji_text(
         update.effective_chat.id,
         q.message.message_id,
-        f"{doc['title']}\n\n{doc['body']}",
+        BSETTINGS_DOC_TEXTS[key],
         context,
         reply_markup=kb,
     )
@@ -5293,7 +5591,7 @@ async def bsettings_misc_input(update: Update, context: ContextTypes.DEFAULT_TYP
 
     if context.user_data.get("bset_setstartimg_wait"):
         raw = text
-        if raw.lower() in ("off", "remove", "none", "disable", "disabled"):
+        if raw.lower() in _CLEAR_SETTING_WORDS:
             await db.set_setting(SETTINGS_START_IMG_URL, None)
             context.user_data.pop("bset_setstartimg_wait", None)
             await _send_emoji_text(update.effective_chat.id, "✅ Start image removed.", context)
@@ -5727,7 +6025,7 @@ async def setstartimg(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         )
         return
     raw = context.args[0].strip()
-    if raw.lower() in ("off", "remove", "none", "disable", "disabled"):
+    if raw.lower() in _CLEAR_SETTING_WORDS:
         db: Database = context.application.bot_data["db"]
         await db.set_setting(SETTINGS_START_IMG_URL, None)
         await _send_emoji_text(update.effective_chat.id, "✅ Start image removed.", context)
@@ -5847,7 +6145,7 @@ async def setuitemoji(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     key = f"{SETTINGS_UI_EMOJI_PREFIX}{name}"
     db: Database = context.application.bot_data["db"]
 
-    if val.lower() in ("off", "remove", "none", "disable", "disabled"):
+    if val.lower() in _CLEAR_SETTING_WORDS:
         await db.set_setting(key, None)
         _invalidate_ui_emoji_cache(context)
         await _send_emoji_text(update.effective_chat.id, f"✅ UI emoji removed for {name}.", context)
@@ -5920,14 +6218,13 @@ async def revenue(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     manual_rev = 0
     star_rev = 0
 
-    import json
     for req in stats_detailed:
         amount = int(req.get("amount_rs") or 0)
         gateway = None
         gateway_extra_raw = req.get("gateway_extra")
         if gateway_extra_raw:
             try:
-                ge = json.loads(gateway_extra_raw)
+                ge = _json_loads(gateway_extra_raw)
                 gateway = ge.get("gateway")
                 if not gateway:
                     if "qr_code_id" in ge or "image_url" in ge:
@@ -5977,8 +6274,7 @@ async def premiumdb(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.effective_chat:
         return
     db: Database = context.application.bot_data["db"]
-    rows = await db.list_premium_records()
-    payment_meta = await db.list_latest_payment_meta()
+    rows, payment_meta = await asyncio.gather(db.list_premium_records(), db.list_latest_payment_meta())
     if not rows:
         await _send_emoji_text(update.effective_chat.id, "ℹ️ No premium records found.", context)
         return
@@ -6028,18 +6324,18 @@ async def premiumdb(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 str(r.get("first_name") or ""),
                 str(r.get("username") or ""),
                 pu,
-                datetime.datetime.utcfromtimestamp(pu).strftime("%Y-%m-%d %H:%M:%S UTC") if pu > 0 else "",
+                _fmt_utc(pu) if pu > 0 else "",
                 "yes" if pu >= now else "no",
                 int(pm.get("request_id") or 0),
                 int(pm.get("amount_rs") or 0),
                 int(pm.get("plan_days") or 0),
                 str(pm.get("status") or ""),
                 pay_ts,
-                datetime.datetime.utcfromtimestamp(pay_ts).strftime("%Y-%m-%d %H:%M:%S UTC") if pay_ts > 0 else "",
+                _fmt_utc(pay_ts) if pay_ts > 0 else "",
                 ca,
-                datetime.datetime.utcfromtimestamp(ca).strftime("%Y-%m-%d %H:%M:%S UTC") if ca > 0 else "",
+                _fmt_utc(ca) if ca > 0 else "",
                 ls,
-                datetime.datetime.utcfromtimestamp(ls).strftime("%Y-%m-%d %H:%M:%S UTC") if ls > 0 else "",
+                _fmt_utc(ls) if ls > 0 else "",
             ]
         )
 
@@ -6048,7 +6344,7 @@ async def premiumdb(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         with tempfile.NamedTemporaryFile(prefix="premium_records_", suffix=".xlsx", delete=False) as tmp:
             tmp_path = tmp.name
         wb.save(tmp_path)
-        date_tag = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        date_tag = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
         with open(tmp_path, "rb") as fh:
             await context.bot.send_document(
                 chat_id=update.effective_chat.id,
@@ -6190,8 +6486,8 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await _send_emoji_text(update.effective_chat.id, "ℹ️ Reply to a message, then send: /broadcast", context)
         return
     db: Database = context.application.bot_data["db"]
-    user_ids = await db.list_user_ids()
-    if not user_ids:
+    total_users = await db.count_users()
+    if not total_users:
         await _send_emoji_text(update.effective_chat.id, "ℹ️ Broadcast ke liye koi user nahi mila.", context)
         return
     src = update.effective_message.reply_to_message
@@ -6200,7 +6496,7 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     start_msg = await _send_emoji_text(
         update.effective_chat.id,
         "📣 Broadcast started\n\n"
-        f"👥 Users: {len(user_ids)}\n"
+        f"👥 Users: {total_users}\n"
         f"⚙️ Parallel workers: {BROADCAST_CONCURRENCY}",
         context,
     )
@@ -6226,14 +6522,18 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                     return False, retries
             return False, retries
 
-    results = await asyncio.gather(*(send_one(int(uid)) for uid in user_ids))
-    ok = sum(1 for sent, _ in results if sent)
-    fail = len(results) - ok
-    retried = sum(retries for _, retries in results)
+    # Stream user ids page by page so huge user tables are never fully materialized.
+    total = ok = retried = 0
+    async for page in db.iter_user_ids():
+        results = await asyncio.gather(*(send_one(uid) for uid in page))
+        total += len(results)
+        ok += sum(1 for sent, _ in results if sent)
+        retried += sum(retries for _, retries in results)
+    fail = total - ok
     elapsed = max(0.1, time.monotonic() - started_at)
     final_text = (
         "📣 Broadcast Completed\n\n"
-        f"👥 Total: {len(user_ids)}\n"
+        f"👥 Total: {total}\n"
         f"✅ Sent: {ok}\n"
         f"⚠️ Failed: {fail}\n"
         f"⏱️ Retried (floodwait): {retried}\n"
@@ -6301,14 +6601,13 @@ async def run_revenue_report_scheduler(application: Application) -> None:
                 manual_rev = 0
                 star_rev = 0
 
-                import json
                 for req in stats_detailed:
                     amount = int(req.get("amount_rs") or 0)
                     gateway = None
                     gateway_extra_raw = req.get("gateway_extra")
                     if gateway_extra_raw:
                         try:
-                            ge = json.loads(gateway_extra_raw)
+                            ge = _json_loads(gateway_extra_raw)
                             gateway = ge.get("gateway")
                             if not gateway:
                                 if "qr_code_id" in ge or "image_url" in ge:
@@ -6628,16 +6927,15 @@ def build_sub_bot_handlers(app: Application) -> None:
 
 async def start_sub_bot(token: str, db, cfg, defaults) -> str:
     # 1. Validate the token and fetch bot info
-    async with httpx.AsyncClient(timeout=10) as client:
-        url = f"https://api.telegram.org/bot{token}/getMe"
-        resp = await client.get(url)
-        if resp.status_code != 200:
-            raise ValueError(f"Invalid bot token or network issue (HTTP {resp.status_code})")
-        data = resp.json()
-        if not data.get("ok"):
-            raise ValueError(f"Invalid bot token response: {data.get('description')}")
-        bot_info = data["result"]
-        username = bot_info["username"]
+    url = f"https://api.telegram.org/bot{token}/getMe"
+    resp = await _get_http_client().get(url, timeout=10)
+    if resp.status_code != 200:
+        raise ValueError(f"Invalid bot token or network issue (HTTP {resp.status_code})")
+    data = resp.json()
+    if not data.get("ok"):
+        raise ValueError(f"Invalid bot token response: {data.get('description')}")
+    bot_info = data["result"]
+    username = bot_info["username"]
 
     # Query log channel and owner from DB
     sub_doc = None
@@ -6722,6 +7020,9 @@ async def start_sub_bot(token: str, db, cfg, defaults) -> str:
 async def stop_sub_bot(token: str) -> None:
     sub_app = RUNNING_SUB_BOTS.pop(token, None)
     if sub_app:
+        autodelete_task = sub_app.bot_data.pop(AUTODELETE_TASK_KEY, None)
+        if autodelete_task:
+            autodelete_task.cancel()
         try:
             if sub_app.updater and sub_app.updater.running:
                 await sub_app.updater.stop()
@@ -6866,6 +7167,13 @@ from bot.dashboard import mbot_callback_router
 
 
 def build_handlers(app: Application) -> None:
+    if app.job_queue:
+        app.job_queue.run_repeating(
+            _payment_expiry_sweep_job,
+            interval=PAYMENT_EXPIRY_SWEEP_SECONDS,
+            first=PAYMENT_EXPIRY_SWEEP_SECONDS,
+            name="pay-expiry-sweep",
+        )
     app.add_handler(TypeHandler(Update, maintenance_middleware_handler), group=-1)
     app.add_handler(PreCheckoutQueryHandler(pre_checkout_callback))
     app.add_handler(MessageHandler(filters.SUCCESSFUL_PAYMENT, successful_payment_callback))
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from dotenv import load_dotenv
@@ -7,7 +8,12 @@ from telegram.ext import Application, Defaults
 from bot.config import Config
 from bot.db import Database
 from bot.db_mongo import MongoDatabase
-from bot.handlers import build_handlers, resume_pending_payments_polling
+from bot.handlers import AUTODELETE_TASK_KEY, build_handlers, resume_pending_payments_polling
+
+try:
+    import uvloop
+except ImportError:  # optional; not available on Windows
+    uvloop = None
 
 
 async def _post_init(app: Application) -> None:
@@ -20,8 +26,8 @@ async def _post_init(app: Application) -> None:
     await db.init()
     app.bot_data["db"] = db
 
-    me = await app.bot.get_me()
-    app.bot_data["bot_username"] = me.username
+    # Application.initialize() already fetched getMe; reuse the cached bot user.
+    app.bot_data["bot_username"] = app.bot.username
 
     # Generate cached donation invoice link for Telegram Stars
     try:
@@ -76,6 +82,11 @@ async def _post_init(app: Application) -> None:
 
 
 async def _post_shutdown(app: Application) -> None:
+    # Stop the main bot's autodelete worker, as stop_sub_bot does for sub-bots.
+    autodelete_task = app.bot_data.pop(AUTODELETE_TASK_KEY, None)
+    if autodelete_task:
+        autodelete_task.cancel()
+
     db = app.bot_data.get("db")
     if db:
         await db.close()
@@ -98,6 +109,13 @@ async def _post_shutdown(app: Application) -> None:
     except Exception:
         pass
 
+    try:
+        from bot import handlers
+        if handlers._http_client is not None and not handlers._http_client.is_closed:
+            await handlers._http_client.aclose()
+    except Exception:
+        pass
+
 
 def main() -> None:
     load_dotenv()
@@ -108,6 +126,9 @@ def main() -> None:
 
     cfg = Config.from_env()
 
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     defaults = Defaults(link_preview_options=LinkPreviewOptions(is_disabled=True))
     app = (
         Application.builder()